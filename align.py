@@ -0,0 +1,165 @@
+# align.py
+
+import bisect
+import difflib
+import re
+
+import numpy as np
+
+# lines in unmatched stretches are paired if their fuzz.ratio is at least this
+FUZZY_RATIO = 60
+
+# how many lines ahead a fuzzy match is looked for
+FUZZY_WINDOW = 10
+
+# largest stretch (lines * lines) without unique lines that is matched with
+# difflib; longer ones go straight to fuzzy matching
+MAX_LCS_CELLS = 250000
+
+_NON_WORD_RE = re.compile(r'\W+')
+
+
+def normalize(text):
+    '''Return the key a line is matched on: its letters and digits,
+       lowercased. Text that was saved as UTF-8 and read back as cp1252, as
+       in some tagged CSVs, is repaired first.'''
+    if not isinstance(text, str):
+        return ''
+    try:
+        text = text.encode('cp1252').decode('utf-8')
+    except UnicodeError:
+        pass
+    return _NON_WORD_RE.sub('', text.lower())
+
+
+def align_rows(raw_texts, tagged_texts):
+    '''Match the lines of a raw issue to the lines of its tagged version.
+       Returns two arrays of line positions, raw and tagged, of the matched
+       pairs in order. Lines that were added, removed or changed beyond
+       recognition are left out.
+
+       Lines are matched as in a patience diff: lines whose key appears once
+       on each side anchor the alignment, and the stretches between anchors
+       are aligned the same way. Stretches without unique lines are matched
+       by their keys with difflib, and what is still unmatched by
+       fuzz.ratio.'''
+    raw_keys = [normalize(text) for text in raw_texts]
+    tagged_keys = [normalize(text) for text in tagged_texts]
+
+    pairs = []
+    gaps = []
+    stack = [(0, len(raw_keys), 0, len(tagged_keys))]
+    while stack:
+        (a_lo, a_hi, b_lo, b_hi) = stack.pop()
+        (a_lo, a_hi, b_lo, b_hi) = _match_ends(raw_keys, tagged_keys, a_lo,
+                                               a_hi, b_lo, b_hi, pairs)
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        anchors = _unique_anchors(raw_keys, tagged_keys, a_lo, a_hi, b_lo,
+                                  b_hi)
+        if anchors:
+            pairs.extend(anchors)
+            bounds = [(a_lo - 1, b_lo - 1)] + anchors + [(a_hi, b_hi)]
+            for ((a_start, b_start), (a_end, b_end)) in zip(bounds,
+                                                            bounds[1:]):
+                stack.append((a_start + 1, a_end, b_start + 1, b_end))
+        else:
+            _match_lcs(raw_keys, tagged_keys, a_lo, a_hi, b_lo, b_hi, pairs,
+                       gaps)
+
+    for gap in gaps:
+        _match_fuzzy(raw_keys, tagged_keys, gap, pairs)
+
+    pairs.sort()
+    raw_positions = np.array([a for (a, _) in pairs], dtype=np.int64)
+    tagged_positions = np.array([b for (_, b) in pairs], dtype=np.int64)
+    return raw_positions, tagged_positions
+
+
+def _match_ends(a, b, a_lo, a_hi, b_lo, b_hi, pairs):
+    '''Match the equal lines at the start and end of a stretch and return
+       what is left of it.'''
+    while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+        pairs.append((a_lo, b_lo))
+        a_lo += 1
+        b_lo += 1
+    while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+        a_hi -= 1
+        b_hi -= 1
+        pairs.append((a_hi, b_hi))
+    return a_lo, a_hi, b_lo, b_hi
+
+
+def _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi):
+    '''Return the longest increasing run of (a position, b position) of the
+       keys that appear exactly once in each side of a stretch.'''
+    a_counts = {}
+    for i in range(a_lo, a_hi):
+        a_counts[a[i]] = i if a[i] not in a_counts else None
+    b_counts = {}
+    for j in range(b_lo, b_hi):
+        b_counts[b[j]] = j if b[j] not in b_counts else None
+
+    candidates = [(i, b_counts[key]) for (key, i) in a_counts.items()
+                  if i is not None and b_counts.get(key) is not None]
+    candidates.sort()
+
+    # patience sorting: longest increasing subsequence of b positions
+    tails = []          # b position ending the best run of each length
+    tail_indexes = []   # candidate index ending the best run of each length
+    previous = [None] * len(candidates)
+    for (n, (_, j)) in enumerate(candidates):
+        length = bisect.bisect_left(tails, j)
+        if length == len(tails):
+            tails.append(j)
+            tail_indexes.append(n)
+        else:
+            tails[length] = j
+            tail_indexes[length] = n
+        previous[n] = tail_indexes[length - 1] if length > 0 else None
+
+    anchors = []
+    n = tail_indexes[-1] if tail_indexes else None
+    while n is not None:
+        anchors.append(candidates[n])
+        n = previous[n]
+    anchors.reverse()
+    return anchors
+
+
+def _match_lcs(a, b, a_lo, a_hi, b_lo, b_hi, pairs, gaps):
+    '''Match equal keys in a stretch without unique lines, e.g. of blank
+       lines, and record the stretches still unmatched in gaps.'''
+    if (a_hi - a_lo) * (b_hi - b_lo) > MAX_LCS_CELLS:
+        gaps.append((a_lo, a_hi, b_lo, b_hi))
+        return
+
+    matcher = difflib.SequenceMatcher(None, a[a_lo:a_hi], b[b_lo:b_hi],
+                                      autojunk=False)
+    (a_start, b_start) = (a_lo, b_lo)
+    for (i, j, size) in matcher.get_matching_blocks():
+        (i, j) = (a_lo + i, b_lo + j)
+        if a_start < i and b_start < j:
+            gaps.append((a_start, i, b_start, j))
+        for k in range(size):
+            pairs.append((i + k, j + k))
+        (a_start, b_start) = (i + size, j + size)
+
+
+def _match_fuzzy(a, b, gap, pairs):
+    '''Pair the lines of an unmatched stretch in order, each with the first
+       of the next FUZZY_WINDOW lines on the other side that is similar
+       enough.'''
+    from fuzzywuzzy import fuzz
+
+    (a_lo, a_hi, b_lo, b_hi) = gap
+    j = b_lo
+    for i in range(a_lo, a_hi):
+        for k in range(j, min(b_hi, j + FUZZY_WINDOW)):
+            if fuzz.ratio(a[i], b[k]) >= FUZZY_RATIO:
+                pairs.append((i, k))
+                j = k + 1
+                break
+        if j == b_hi:
+            break
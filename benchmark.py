@@ -0,0 +1,262 @@
+# benchmark.py
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import corpus
+import reconstructor
+import tagger.junktagger as jkt
+import tagger.nbtables as nbtables
+import tagger.txttagger as ttt
+from tagger.basetagger import Issue, load_classifier
+
+
+# timed passes per measurement; the fastest is reported
+REPEAT = 5
+
+
+def main():
+    parser = setup_args()
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.data_dir, '*.txt')))
+    args.func(args, paths[:args.limit])
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the \
+    article reconstruction pipeline.')
+
+    parser.add_argument('--data',
+                        metavar='DATA_DIR',
+                        default='raw_data',
+                        dest='data_dir',
+                        help='Directory of raw ABBYY .txt issues (default: \
+                        raw_data).')
+
+    parser.add_argument('--limit',
+                        metavar='N',
+                        type=int,
+                        default=None,
+                        dest='limit',
+                        help='Only benchmark the first N issues.')
+
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    copy_parser = subparsers.add_parser('copy',
+                                        help='Copy per tagger vs. tagging one \
+                                        issue in place.')
+    copy_parser.set_defaults(func=bench_copy)
+
+    label_parser = subparsers.add_parser('label',
+                                         help='Throughput of each labeling \
+                                         pass of the junk and text taggers.')
+    label_parser.set_defaults(func=bench_label)
+
+    classify_parser = subparsers.add_parser('classify',
+                                            help='NLTK Naive Bayes vs. compiled \
+                                            tables on the same features.')
+    classify_parser.set_defaults(func=bench_classify)
+
+    load_parser = subparsers.add_parser('load',
+                                        help='Reading raw .txt issues one \
+                                        file at a time vs. from a packed \
+                                        corpus.')
+    load_parser.set_defaults(func=bench_load)
+
+    startup_parser = subparsers.add_parser('startup',
+                                           help='Start-up time of \
+                                           reconstructor.py, each in a fresh \
+                                           interpreter.')
+    startup_parser.set_defaults(func=bench_startup)
+
+    return parser
+
+
+def load_issues(paths):
+    '''Read raw issues into untagged Issue() objects.'''
+    return [Issue(reconstructor.gen_blank_df(path, Issue.COLUMNS), path)
+            for path in paths]
+
+
+def measure(func, issues, repeat=REPEAT):
+    '''Run func over every issue, returning (seconds for the fastest of repeat
+       passes, largest number of bytes func allocated on top of one issue).'''
+    elapsed = time_passes(func, issues, repeat)
+
+    peak = 0
+    tracemalloc.start()
+    for issue in issues:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func(issue)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def time_passes(func, issues, repeat=REPEAT):
+    '''Return the fastest of repeat passes of func over every issue.'''
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for issue in issues:
+            func(issue)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def print_comparison(title, before, after, num_issues):
+    '''Print timing and memory of two strategies side by side.'''
+    print(title)
+    print('{:<12} {:>12} {:>16}'.format('', 'ms/issue', 'extra peak MiB'))
+    for name, (elapsed, peak) in [('before', before), ('after', after)]:
+        print('{:<12} {:>12.2f} {:>16.2f}'.format(name,
+                                                  elapsed / num_issues * 1000,
+                                                  peak / 2**20))
+    print('speedup: {:.1f}x'.format(before[0] / after[0]))
+
+
+def bench_copy(args, paths):
+    '''Compare the real tagger chain with every tagger copying the issue,
+       tag(issue), against the in-place chain run_taggers uses,
+       tag(issue, inplace=True). Each pass tags its own copy of the untagged
+       issues, and runs once since tagging takes seconds per issue.'''
+    issues = load_issues(paths)
+
+    def copy_chain(issue):
+        issue = issue.copy()
+        for (_, tag) in reconstructor.TAGGERS:
+            issue = tag(issue)
+
+    def inplace_chain(issue):
+        issue = issue.copy()
+        for (_, tag) in reconstructor.TAGGERS:
+            issue = tag(issue, inplace=True)
+
+    # load the classifiers and lexicons before timing either chain
+    inplace_chain(issues[0])
+
+    before = measure(copy_chain, issues, repeat=1)
+    after = measure(inplace_chain, issues, repeat=1)
+    print_comparison('Tagger chain, {} issues'.format(len(issues)),
+                     before, after, len(issues))
+
+
+def bench_label(args, paths):
+    '''Report lines/sec of each labeling pass run by junktagger.tag and
+       txttagger.tag. Every pass sees the labels of the passes before it.'''
+    issues = load_issues(paths)
+    num_lines = sum(len(issue.tags_df) for issue in issues)
+
+    passes = [('blank', lambda issue: issue.label(jkt._tag_blank)),
+              ('jump', lambda issue: issue.label(jkt._tag_jump)),
+              ('section header',
+               lambda issue: issue.label(jkt._tag_section_header))]
+    for (filename, features_func, tags, label_func) in \
+            jkt._JUNKTAGGER_CLASSIFIERS + [ttt._TXTTAGGER_CLASSIFIER]:
+        passes.append(('classifier ' + '/'.join(tags),
+                       lambda issue, filename=filename,
+                              features_func=features_func,
+                              label_func=label_func:
+                           issue.label_with_classifier(filename, features_func,
+                                                       label_func)))
+        if filename == jkt._JUNKTAGGER_CLASSIFIERS[-1][0]:
+            passes.append(('in range', jkt._apply_in_range))
+
+    print('Labeling throughput, {} issues, {} lines'.format(len(issues),
+                                                            num_lines))
+    for (name, label_pass) in passes:
+        copies = [[issue.copy() for issue in issues] for _ in range(REPEAT)]
+        elapsed = min(time_passes(label_pass, issue_copies, repeat=1)
+                      for issue_copies in copies)
+        print('{:<24} {:>12.0f} lines/s'.format(name, num_lines / elapsed))
+
+        # the next pass starts from this pass's labels
+        for issue in issues:
+            label_pass(issue)
+
+
+def bench_classify(args, paths):
+    '''Compare classifying every line with each NLTK classifier against its
+       compiled NaiveBayesTable. Feature extraction is not timed.'''
+    issues = load_issues(paths)
+    lines = [line for issue in issues for line in issue.get_line_features()
+             if line is not None and line.stripped]
+
+    print('Classification throughput, {} lines'.format(len(lines)))
+    print('{:<36} {:>12} {:>12} {:>8}'.format('', 'nltk/s', 'table/s',
+                                              'diffs'))
+    for (filename, features_func, _, _) in \
+            jkt._JUNKTAGGER_CLASSIFIERS + [ttt._TXTTAGGER_CLASSIFIER]:
+        classifier = load_classifier(filename)
+        table = nbtables.NaiveBayesTable.from_classifier(classifier)
+        featuresets = [features_func(line) for line in lines]
+
+        timings = [time_passes(model.classify_many, [featuresets])
+                   for model in (classifier, table)]
+        diffs = sum(a != b for a, b in zip(classifier.classify_many(featuresets),
+                                           table.classify_many(featuresets)))
+        print('{:<36} {:>12.0f} {:>12.0f} {:>8}'.format(
+            filename, len(lines) / timings[0], len(lines) / timings[1], diffs))
+
+
+def bench_load(args, paths):
+    '''Compare loading every issue into an untagged DataFrame from its own
+       .txt file against slicing it out of a corpus packed from the same
+       files.'''
+    corpus_dir = tempfile.mkdtemp()
+    try:
+        corpus.pack(paths, corpus_dir)
+        with corpus.Corpus(corpus_dir) as packed:
+            before = measure(lambda path: reconstructor.gen_blank_df(
+                path, Issue.COLUMNS), paths)
+            after = measure(lambda path: packed.issue_df(path, Issue.COLUMNS),
+                            paths)
+    finally:
+        shutil.rmtree(corpus_dir)
+    print_comparison('Loading {} raw issues, files vs. packed corpus'.format(
+        len(paths)), before, after, len(paths))
+
+
+def bench_startup(args, paths):
+    '''Time fresh interpreters running reconstructor.py --help, importing
+       reconstructor, and reconstructing a single issue. The name lexicons
+       are cached by the first run, so only the fastest run is reported.'''
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'reconstructor.py')
+    one_issue = ('import sys, reconstructor; '
+                 'list(reconstructor.reconstruct_iter(sys.argv[1:]))')
+    commands = [('--help', [sys.executable, script, '--help']),
+                ('import', [sys.executable, '-c', 'import reconstructor'])]
+    if paths:
+        commands.append(('one issue',
+                         [sys.executable, '-c', one_issue, paths[0]]))
+
+    print('Start-up time, fastest of {} runs'.format(REPEAT))
+    for (name, command) in commands:
+        timings = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            result = subprocess.run(command, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL,
+                                    cwd=os.path.dirname(script))
+            timings.append(time.perf_counter() - start)
+            if result.returncode != 0:
+                break
+        print('{:<12} {:>10.3f} s{}'.format(
+            name, min(timings),
+            '' if result.returncode == 0 else
+            '  (exited with {})'.format(result.returncode)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# corpus.py
+
+import argparse
+import glob
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+import tagger.schema as schema
+
+# files of a packed corpus directory
+TEXT_FILE = 'text.bin'
+INDEX_FILE = 'index.npz'
+
+
+def read_lines(path):
+    '''Return the lines of a UTF-8 text file without their line endings,
+       split exactly as reading it in text mode would: on \\r\\n, \\r and \\n.
+       The file is memory-mapped and decoded in one step.'''
+    with open(path, 'rb') as file_in:
+        try:
+            with mmap.mmap(file_in.fileno(), 0,
+                           access=mmap.ACCESS_READ) as data:
+                text = str(data, 'utf-8')
+        except ValueError:
+            # empty files can't be mapped
+            text = ''
+    return split_lines(text)
+
+
+def split_lines(text):
+    '''Split text on universal newlines only. Unlike str.splitlines(), form
+       feeds and other Unicode line breaks are left inside lines.'''
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    if lines[-1] == '':
+        # the file ended with a newline, or was empty
+        lines.pop()
+    return lines
+
+
+def lines_to_df(lines, columns):
+    '''Build an untagged issue DataFrame: lines in the text column, every
+       other column untagged in its tagger.schema dtype.'''
+    index = pd.RangeIndex(len(lines))
+    data = {}
+    for col in columns:
+        if col == 'text':
+            data[col] = lines
+        else:
+            data[col] = schema.empty_column(col, index)
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def load_issue(path, columns):
+    '''Read a raw ABBYY .txt issue into an untagged DataFrame.'''
+    return lines_to_df(read_lines(path), columns)
+
+
+def is_packed(path):
+    '''True if path is a corpus directory written by pack().'''
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+def pack(paths, directory):
+    '''Pack the raw issues in paths into directory: every line of every issue
+       in one UTF-8 blob, one line per \\n, plus an index of the byte offset
+       of each line and the first line of each issue.'''
+    os.makedirs(directory, exist_ok=True)
+
+    names = []
+    issue_starts = [0]
+    line_offsets = [0]
+    tmp_text_file = os.path.join(directory, TEXT_FILE + '.tmp')
+    with open(tmp_text_file, 'wb') as file_out:
+        for path in paths:
+            for line in read_lines(path):
+                data = (line + '\n').encode('utf-8')
+                file_out.write(data)
+                line_offsets.append(line_offsets[-1] + len(data))
+            names.append(os.path.basename(path))
+            issue_starts.append(len(line_offsets) - 1)
+
+    tmp_index_file = os.path.join(directory, 'index.tmp.npz')
+    np.savez(tmp_index_file,
+             names=np.array(names, dtype=str),
+             issue_starts=np.array(issue_starts, dtype=np.int64),
+             line_offsets=np.array(line_offsets, dtype=np.int64))
+    os.replace(tmp_text_file, os.path.join(directory, TEXT_FILE))
+    os.replace(tmp_index_file, os.path.join(directory, INDEX_FILE))
+
+
+class Corpus(object):
+    '''A corpus written by pack(). The text is memory-mapped, so opening a
+       corpus reads only its index and slicing out an issue reads only that
+       issue's bytes.'''
+
+    def __init__(self, directory):
+        self.directory = directory
+        with np.load(os.path.join(directory, INDEX_FILE)) as index:
+            self.names = [str(name) for name in index['names']]
+            self.issue_starts = index['issue_starts']
+            self.line_offsets = index['line_offsets']
+        self.positions = {name: i for (i, name) in enumerate(self.names)}
+
+        self._file = open(os.path.join(directory, TEXT_FILE), 'rb')
+        try:
+            self._text = mmap.mmap(self._file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        except ValueError:
+            # a corpus of empty issues
+            self._text = b''
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return os.path.basename(name) in self.positions
+
+    def lines(self, name):
+        '''Return the lines of the issue packed from a file named name.'''
+        i = self.positions[os.path.basename(name)]
+        first = self.issue_starts[i]
+        last = self.issue_starts[i + 1]
+        if first == last:
+            return []
+        data = self._text[self.line_offsets[first]:self.line_offsets[last]]
+        # drop the empty string after the final \n
+        return str(data, 'utf-8').split('\n')[:-1]
+
+    def line(self, n):
+        '''Return line n of the whole corpus.'''
+        data = self._text[self.line_offsets[n]:self.line_offsets[n + 1] - 1]
+        return str(data, 'utf-8')
+
+    def issue_df(self, name, columns):
+        '''Return the untagged DataFrame of an issue.'''
+        return lines_to_df(self.lines(name), columns)
+
+    def close(self):
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack a directory of raw \
+    ABBYY .txt issues into a single corpus for reconstructor.py --data.')
+
+    parser.add_argument('--data',
+                        required=True,
+                        metavar='DATA_DIR',
+                        dest='data_dir',
+                        help='Directory of raw .txt issues.')
+
+    parser.add_argument('--out',
+                        required=True,
+                        metavar='CORPUS_DIR',
+                        dest='out_dir',
+                        help='Directory to write the packed corpus to.')
+
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.data_dir, '*.txt')))
+    pack(paths, args.out_dir)
+    print('packed {} issues into {}'.format(len(paths), args.out_dir))
+
+
+if __name__ == "__main__":
+    main()
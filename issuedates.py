@@ -0,0 +1,117 @@
+# issuedates.py
+
+import csv
+import datetime
+import functools
+import os
+import re
+
+# spreadsheet of every issue's date and metadata, relative to this directory
+DATES_FILE = 'newspaper_dates.csv'
+
+# Identifier of an issue, as found in its file names
+IDENTIFIER_RE = re.compile(r'ua-nws_\d{8}')
+
+
+def identifier(path):
+    '''Return the spreadsheet Identifier in a file name, or None.'''
+    match = IDENTIFIER_RE.search(path or '')
+    return match.group(0) if match else None
+
+
+def parse_date(text):
+    '''Parse a date as written in the spreadsheet (M/D/YYYY) or on the
+       command line (YYYY-MM-DD).'''
+    for date_format in ('%m/%d/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError('unrecognized date: {!r}'.format(text))
+
+
+def parse_school_year(text):
+    '''Return the first year of a school year given as 1983 or 1983-1984.'''
+    match = re.match(r'\s*(\d{4})(?:-(\d{4}))?\s*$', text)
+    if not match:
+        raise ValueError('unrecognized school year: {!r}'.format(text))
+    return int(match.group(1))
+
+
+def _to_int(text):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+class IssueDates(object):
+    '''Index of the dates spreadsheet by Identifier. Each entry holds the
+       spreadsheet's pub_date as written, the parsed date, and the volume,
+       issue, page count and school year of the issue. Where an Identifier
+       is listed more than once its first row is used.'''
+
+    def __init__(self, rows):
+        self.issues = {}
+        for row in rows:
+            name = (row.get('Identifier') or '').strip()
+            if not name or name in self.issues:
+                continue
+            pub_date = (row.get('pub_date') or '').strip() or None
+            try:
+                date = parse_date(pub_date) if pub_date else None
+            except ValueError:
+                date = None
+            self.issues[name] = {'title': row.get('title'),
+                                 'volume': _to_int(row.get('volume')),
+                                 'issue': row.get('issue'),
+                                 'total_pages': _to_int(row.get('total_pages')),
+                                 'pub_date': pub_date,
+                                 'date': date,
+                                 'school_year': _to_int(row.get('School Year')),
+                                 'url': row.get('url')}
+
+    @classmethod
+    def read(cls, filename):
+        with open(filename, 'r', newline='', encoding='utf-8') as file_in:
+            return cls(csv.DictReader(file_in))
+
+    def get(self, path):
+        '''Return the entry of the issue a file name belongs to, or None.'''
+        return self.issues.get(identifier(path))
+
+    def pub_date(self, path):
+        '''Return the spreadsheet pub_date of an issue, or None.'''
+        entry = self.get(path)
+        return entry['pub_date'] if entry else None
+
+    def select(self, paths, start=None, end=None, school_year=None):
+        '''Return the paths whose issue falls between the dates start and end
+           (inclusive) and in the school year starting in school_year. Any
+           bound may be None. Issues without a known date are dropped if any
+           bound is given.'''
+        if start is None and end is None and school_year is None:
+            return list(paths)
+
+        selected = []
+        for path in paths:
+            entry = self.get(path)
+            if entry is None or entry['date'] is None:
+                continue
+            if start is not None and entry['date'] < start:
+                continue
+            if end is not None and entry['date'] > end:
+                continue
+            if school_year is not None and entry['school_year'] != school_year:
+                continue
+            selected.append(path)
+        return selected
+
+
+@functools.lru_cache(maxsize=None)
+def load(filename=None):
+    '''Return the IssueDates of filename (default: DATES_FILE next to this
+       module), reading it only the first time it is asked for.'''
+    filename = filename or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), DATES_FILE)
+    return IssueDates.read(filename)
@@ -0,0 +1,129 @@
+# manifest.py
+
+import collections
+import glob
+import hashlib
+import json
+import os
+
+# files, relative to this directory, whose contents decide how an issue is
+# tagged and reconstructed
+VERSIONED_FILES = ['reconstructor.py',
+                   'corpus.py',
+                   'issuedates.py',
+                   'sinks.py',
+                   'newspaper_dates.csv',
+                   'tagger/*.py',
+                   'tagger/classifiers/*.pickle']
+
+# bumped whenever the manifest layout changes
+MANIFEST_FORMAT = 1
+
+
+def file_hash(path):
+    '''Return the SHA-1 hex digest of a file's contents.'''
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file_in:
+        for chunk in iter(lambda: file_in.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tagger_hashes(root=None):
+    '''Return {relative path: hash} for every file in VERSIONED_FILES.'''
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    hashes = {}
+    for pattern in VERSIONED_FILES:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            hashes[os.path.relpath(path, root)] = file_hash(path)
+    return hashes
+
+
+def tagger_version(hashes):
+    '''Combine the hashes from tagger_hashes() into a single version.'''
+    digest = hashlib.sha1()
+    for name in sorted(hashes):
+        digest.update('{} {}\n'.format(name, hashes[name]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Manifest(object):
+    '''Record of which input files have been processed, by which version of
+       the taggers, and which output files each one produced. Entries are
+       keyed by the input's file name, so moving the data directory does not
+       invalidate them.'''
+
+    def __init__(self, filename, hashes, issues=None):
+        self.filename = filename
+        self.hashes = hashes
+        self.version = tagger_version(hashes)
+        self.issues = issues if issues is not None else {}
+
+        # input hashes computed by changed(), waiting for record()
+        self._pending = {}
+
+        # number of issues that wrote each output file; some outputs, like
+        # a SQLite database, are shared by many issues
+        self._refs = collections.Counter(output
+                                         for entry in self.issues.values()
+                                         for output in entry['outputs'])
+
+    @classmethod
+    def load(cls, filename, hashes=None):
+        '''Read filename if it exists, otherwise start an empty manifest.'''
+        hashes = hashes if hashes is not None else tagger_hashes()
+        issues = None
+        if os.path.exists(filename):
+            with open(filename, 'r') as file_in:
+                data = json.load(file_in)
+            if data.get('format') == MANIFEST_FORMAT:
+                issues = data['issues']
+        return cls(filename, hashes, issues)
+
+    def is_current(self, path, input_hash):
+        '''True if path was processed from the same contents by the same
+           taggers and all of its outputs are still on disk.'''
+        entry = self.issues.get(os.path.basename(path))
+        return (entry is not None and
+                entry['input'] == input_hash and
+                entry['taggers'] == self.version and
+                all(os.path.exists(output) for output in entry['outputs']))
+
+    def changed(self, paths):
+        '''Return the paths that are new or have changed since they were
+           last recorded.'''
+        changed = []
+        for path in paths:
+            input_hash = file_hash(path)
+            if not self.is_current(path, input_hash):
+                self._pending[os.path.basename(path)] = input_hash
+                changed.append(path)
+        return changed
+
+    def record(self, path, outputs):
+        '''Record that path produced outputs, deleting any file it produced
+           last time that it no longer does and no other issue wrote.'''
+        name = os.path.basename(path)
+        input_hash = self._pending.pop(name, None) or file_hash(path)
+
+        old = self.issues.get(name, {}).get('outputs', [])
+        self._refs.subtract(old)
+        self._refs.update(outputs)
+        for stale in set(old) - set(outputs):
+            if self._refs[stale] <= 0 and os.path.exists(stale):
+                os.remove(stale)
+
+        self.issues[name] = {'input': input_hash,
+                             'taggers': self.version,
+                             'outputs': sorted(outputs)}
+
+    def save(self):
+        '''Write the manifest, replacing the old file only once the new one
+           is complete.'''
+        data = {'format': MANIFEST_FORMAT,
+                'taggers': self.hashes,
+                'issues': self.issues}
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as file_out:
+            json.dump(data, file_out, indent=1, sort_keys=True)
+        os.replace(tmp_filename, self.filename)
@@ -0,0 +1,79 @@
+# matching.py
+
+import difflib
+
+import numpy as np
+
+# texts are matched if their fuzz.ratio is above this
+THRESHOLD = 80
+
+# candidates proposed for each text when there are more than this to choose
+# from
+TOP_K = 3
+
+
+def max_ratio(len_a, len_b):
+    '''Return the highest fuzz.ratio two texts of these lengths can have:
+       every character of the shorter one matched.'''
+    if not len_a + len_b:
+        return 0
+    return 200 * min(len_a, len_b) / (len_a + len_b)
+
+
+def candidate_pairs(left, right, top_k=TOP_K):
+    '''Return the (i, j) pairs of texts worth comparing: for each left[i],
+       the top_k right[j] most similar by the cosine of their TF-IDF
+       weighted character trigrams, or every right[j] if there are no more
+       than top_k.'''
+    if len(right) <= top_k:
+        return [(i, j) for i in range(len(left)) for j in range(len(right))]
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 3))
+    try:
+        vectors = vectorizer.fit_transform(list(left) + list(right))
+    except ValueError:
+        # no trigrams at all, e.g. only empty texts
+        return []
+    similarity = (vectors[:len(left)] * vectors[len(left):].T).toarray()
+    best = np.argsort(-similarity, axis=1, kind='stable')[:, :top_k]
+    return [(i, int(j)) for i in range(len(left)) for j in best[i]
+            if similarity[i, j] > 0]
+
+
+def similar_pairs(left, right, threshold=THRESHOLD, top_k=TOP_K):
+    '''Return (i, j, ratio) for the candidate pairs whose fuzz.ratio is
+       above threshold. Pairs that can't clear it because of their lengths,
+       or the characters they share, are skipped without computing it.'''
+    from fuzzywuzzy import fuzz
+
+    results = []
+    for (i, j) in candidate_pairs(left, right, top_k):
+        (a, b) = (left[i], right[j])
+        if max_ratio(len(a), len(b)) <= threshold:
+            continue
+        if 100 * difflib.SequenceMatcher(None, a, b).quick_ratio() <= threshold:
+            continue
+        ratio = fuzz.ratio(a, b)
+        if ratio > threshold:
+            results.append((i, j, ratio))
+    return results
+
+
+def match(left, right, threshold=THRESHOLD, top_k=TOP_K):
+    '''Pair texts one to one, maximizing the total fuzz.ratio of the pairs,
+       among the pairs above threshold. Returns (i, j, ratio) in order of
+       i.'''
+    pairs = similar_pairs(left, right, threshold, top_k)
+    if not pairs:
+        return []
+
+    from scipy.optimize import linear_sum_assignment
+
+    scores = np.zeros((len(left), len(right)))
+    for (i, j, ratio) in pairs:
+        scores[i, j] = ratio
+    rows, cols = linear_sum_assignment(scores, maximize=True)
+    return [(int(i), int(j), int(scores[i, j])) for (i, j) in zip(rows, cols)
+            if scores[i, j] > 0]
@@ -0,0 +1,109 @@
+# metrics.py
+
+import numpy as np
+import pandas as pd
+
+import tagger.schema as schema
+
+# label of rows without a function tag
+UNTAGGED = '(none)'
+
+
+class ConfusionMatrix(object):
+    '''Counts of (expected tag, actual tag) over any number of issues, where
+       expected is the manually tagged function and actual is the one the
+       taggers produced. Rows without a tag count under UNTAGGED. Issues are
+       added one at a time, so a whole corpus is scored in a single pass.'''
+
+    def __init__(self, labels=None):
+        self.labels = [UNTAGGED] + sorted(labels or schema.FUNCTION_TAGS)
+        self.counts = np.zeros((len(self.labels), len(self.labels)),
+                               dtype=np.int64)
+
+    def add_labels(self, labels):
+        '''Add rows and columns for any labels not counted before.'''
+        new_labels = sorted(set(labels) - set(self.labels))
+        if new_labels:
+            self.labels.extend(new_labels)
+            self.counts = np.pad(self.counts, (0, len(new_labels)),
+                                 mode='constant')
+
+    def codes(self, tags):
+        '''Return the label index of every tag, adding labels for tags not
+           seen before.'''
+        tags = pd.Series(np.asarray(tags, dtype=object))
+        tags = tags.where(tags.notnull() & (tags != ''), UNTAGGED)
+        self.add_labels(tags.unique())
+        return pd.Categorical(tags, categories=self.labels).codes
+
+    def add(self, expected, actual):
+        '''Count the rows of two aligned sequences of tags.'''
+        assert len(expected) == len(actual), 'tags not aligned'
+        expected_codes = self.codes(expected).astype(np.int64)
+        actual_codes = self.codes(actual).astype(np.int64)
+        n = len(self.labels)
+        self.counts += np.bincount(expected_codes * n + actual_codes,
+                                   minlength=n * n).reshape(n, n)
+        return self
+
+    def __iadd__(self, other):
+        self.add_labels(other.labels)
+        positions = [self.labels.index(label) for label in other.labels]
+        self.counts[np.ix_(positions, positions)] += other.counts
+        return self
+
+    def to_df(self):
+        '''Return the counts as a DataFrame, expected tags down the side and
+           actual tags across the top, leaving out unused tags.'''
+        df = pd.DataFrame(self.counts, index=self.labels, columns=self.labels)
+        used = (df.sum(axis=0) + df.sum(axis=1)) > 0
+        df = df.loc[used, used]
+        df.index.name = 'expected'
+        df.columns.name = 'actual'
+        return df
+
+    def summary(self):
+        '''Return (precision, recall) over all rows, as compare_dfs() has
+           always reported them: a row is a true positive if its tags match,
+           a false negative if the taggers left it untagged and a false
+           positive otherwise.'''
+        untagged = self.labels.index(UNTAGGED)
+        false_negs = self.counts[:, untagged].sum()
+        true_pos = np.trace(self.counts) - self.counts[untagged, untagged]
+        false_pos = self.counts.sum() - true_pos - false_negs
+        return calc_prec_recall(int(true_pos), int(false_pos), int(false_negs))
+
+    def report(self):
+        '''Return the precision, recall, F1 and support (expected rows) of
+           every tag that was expected or produced.'''
+        true_pos = np.diag(self.counts)
+        actual = self.counts.sum(axis=0)
+        expected = self.counts.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = np.where(actual > 0, true_pos / actual, 0.0)
+            recall = np.where(expected > 0, true_pos / expected, 0.0)
+            f1 = np.where(precision + recall > 0,
+                          2 * precision * recall / (precision + recall), 0.0)
+        df = pd.DataFrame({'precision': precision,
+                           'recall': recall,
+                           'f1': f1,
+                           'support': expected},
+                          index=self.labels,
+                          columns=['precision', 'recall', 'f1', 'support'])
+        df = df[((actual > 0) | (expected > 0)) &
+                (df.index != UNTAGGED)].sort_index()
+        df.index.name = 'tag'
+        return df
+
+
+def calc_prec_recall(true_pos, false_pos, false_negs):
+    '''Return (precision, recall), 0 where undefined.'''
+    if (true_pos + false_pos) == 0:
+        precision = 0
+    else:
+        precision = true_pos / (true_pos + false_pos)
+    if (true_pos + false_negs) == 0:
+        recall = 0
+    else:
+        recall = true_pos / (true_pos + false_negs)
+    return precision, recall
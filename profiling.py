@@ -0,0 +1,150 @@
+# profiling.py
+
+import contextlib
+import datetime
+import json
+import os
+import time
+
+# prefix of every metric in the Prometheus summary
+METRIC_PREFIX = 'reconstructor'
+
+
+class Profile(object):
+    '''Wall time, CPU time and number of lines of each stage of the pipeline
+       for each issue. CPU time is that of the process the stage ran in, so
+       stages tagged by --jobs workers are counted in the worker.'''
+
+    def __init__(self):
+        self.records = []
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def record(self, stage, issue_obj, wall_seconds, cpu_seconds, lines=None):
+        '''Add the timing of one stage of one issue.'''
+        self.records.append({'stage': stage,
+                             'issue': os.path.basename(issue_obj.filename or ''),
+                             'lines': (len(issue_obj.tags_df) if lines is None
+                                       else lines),
+                             'wall_seconds': wall_seconds,
+                             'cpu_seconds': cpu_seconds})
+
+    @contextlib.contextmanager
+    def timed(self, stage, issue_obj):
+        '''Time the body of a with statement as stage of issue_obj.'''
+        lines = len(issue_obj.tags_df)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        yield
+        self.record(stage, issue_obj, time.perf_counter() - wall,
+                    time.process_time() - cpu, lines)
+
+    def timed_iter(self, stage, issues):
+        '''Pass (pub_info, Issue()) pairs through, timing how long each one
+           took to produce as stage.'''
+        issues = iter(issues)
+        while True:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                item = next(issues)
+            except StopIteration:
+                return
+            self.record(stage, item[1], time.perf_counter() - wall,
+                        time.process_time() - cpu)
+            yield item
+
+    def add(self, issue_obj):
+        '''Move the timings recorded on issue_obj (by a worker) into the
+           profile.'''
+        self.records.extend(issue_obj.timings)
+        issue_obj.timings = []
+
+    def summary(self):
+        '''Return {stage: totals} in the order stages were first seen.'''
+        stages = {}
+        for record in self.records:
+            totals = stages.setdefault(record['stage'],
+                                       {'issues': 0, 'lines': 0,
+                                        'wall_seconds': 0.0,
+                                        'cpu_seconds': 0.0})
+            totals['issues'] += 1
+            totals['lines'] += record['lines']
+            totals['wall_seconds'] += record['wall_seconds']
+            totals['cpu_seconds'] += record['cpu_seconds']
+
+        for totals in stages.values():
+            wall = totals['wall_seconds']
+            totals['lines_per_second'] = totals['lines'] / wall if wall else 0.0
+        return stages
+
+    def report(self):
+        '''Return the whole profile as a JSON-serializable dict.'''
+        return {'started': self.started.isoformat(),
+                'wall_seconds': time.perf_counter() - self._wall,
+                'cpu_seconds': time.process_time() - self._cpu,
+                'issues': len({record['issue'] for record in self.records}),
+                'stages': self.summary(),
+                'records': self.records}
+
+    def write(self, filename):
+        '''Write the JSON report to filename and a Prometheus textfile
+           summary next to it, with a .prom extension.'''
+        report = self.report()
+        write_atomic(filename, json.dumps(report, indent=4))
+        write_atomic(os.path.splitext(filename)[0] + '.prom',
+                     prometheus_text(report))
+
+
+def timed(profile, stage, issue_obj):
+    '''profile.timed(stage, issue_obj), or a no-op if profile is None.'''
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.timed(stage, issue_obj)
+
+
+def prometheus_text(report):
+    '''Format a report as Prometheus text exposition format.'''
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        name = '{}_{}'.format(METRIC_PREFIX, name)
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for (labels, value) in samples:
+            label_text = ','.join('{}="{}"'.format(k, v) for k, v in labels)
+            lines.append('{}{} {}'.format(
+                name, '{' + label_text + '}' if label_text else '',
+                repr(float(value))))
+
+    stages = report['stages']
+    metric('stage_wall_seconds', 'gauge',
+           'Wall time spent in each stage, summed over issues.',
+           [([('stage', s)], t['wall_seconds']) for s, t in stages.items()])
+    metric('stage_cpu_seconds', 'gauge',
+           'CPU time spent in each stage, summed over issues.',
+           [([('stage', s)], t['cpu_seconds']) for s, t in stages.items()])
+    metric('stage_lines', 'gauge',
+           'Lines processed by each stage.',
+           [([('stage', s)], t['lines']) for s, t in stages.items()])
+    metric('stage_lines_per_second', 'gauge',
+           'Lines processed by each stage per second of its wall time.',
+           [([('stage', s)], t['lines_per_second']) for s, t in stages.items()])
+    metric('run_wall_seconds', 'gauge',
+           'Wall time of the whole run.', [([], report['wall_seconds'])])
+    metric('run_issues', 'gauge',
+           'Issues processed by the run.', [([], report['issues'])])
+    metric('run_start_time_seconds', 'gauge',
+           'Unix time the run started.',
+           [([], datetime.datetime.fromisoformat(report['started'])
+                 .timestamp())])
+    return '\n'.join(lines) + '\n'
+
+
+def write_atomic(filename, text):
+    '''Write text to filename so readers never see a partial file.'''
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as file_out:
+        file_out.write(text)
+    os.replace(tmp_filename, filename)
@@ -1,14 +1,24 @@
 # reconstructor.py
 # Jon Doughty
 
-from fuzzywuzzy import fuzz
 import argparse
 import pandas as pd
-import json
 import re
 import glob
+import multiprocessing
+import collections
+import functools
 import sys
 
+import align
+import corpus
+import issuedates
+import matching
+import metrics
+import sinks
+from manifest import Manifest, tagger_hashes
+from profiling import Profile, timed
+from stagecache import StageCache
 from tagger.basetagger import *
 import tagger.pubtagger as pbt
 import tagger.hltagger as hlt
@@ -17,9 +27,22 @@ import tagger.junktagger as jkt
 import tagger.txttagger as ttt
 import tagger.jumptagger as jpt
 import tagger.articlenumtagger as ant
+import tagger.groundtruth as groundtruth
 
 DEBUG = None
 
+# number of issues queued per worker process when tagging with --jobs
+IN_FLIGHT_PER_JOB = 2
+
+# (stage name, tagger), in the order they are applied to an issue
+TAGGERS = [('pub', pbt.tag),
+           ('bl', blt.tag),
+           ('hl', hlt.tag),
+           ('junk', jkt.tag),
+           ('txt', ttt.tag),
+           ('jump', jpt.tag),
+           ('articlenum', ant.tag)]
+
 def main():
     global DEBUG
 
@@ -27,6 +50,16 @@ def main():
     parser = setup_args()
     args = parser.parse_args()
 
+    if args.from_stage and not args.stage_cache_dir:
+        parser.error('--from-stage requires --stage-cache')
+
+    # where and how reconstructed articles are written
+    try:
+        sink = sinks.open_sink(args.output_format, args.output_dir,
+                               shard_by=args.shard_by, compress=args.compress)
+    except ImportError as e:
+        parser.error(str(e))
+
     # set debug flag
     DEBUG = args.debug_flag
 
@@ -36,109 +69,250 @@ def main():
     # get type of file we are working with (csv for tagged data, txt for raw)
     file_type = '*.csv' if args.tagged_data else '*.txt'
 
-    # get all files in specified directory
-    paths = glob.glob(os.path.join(args.data_dir[0], file_type))
+    # get all files in specified directory, or every issue of a corpus
+    # packed with corpus.py
+    packed = None
+    if args.raw_data and corpus.is_packed(args.data_dir[0]):
+        if args.manifest_file:
+            parser.error('--manifest can not be used with a packed corpus')
+        packed = corpus.Corpus(args.data_dir[0])
+        paths = list(packed.names)
+    else:
+        paths = glob.glob(os.path.join(args.data_dir[0], file_type))
+
+    # only process issues published in the requested dates
+    if args.start_date or args.end_date or args.school_year:
+        num_paths = len(paths)
+        paths = issuedates.load().select(paths,
+                                         start=args.start_date,
+                                         end=args.end_date,
+                                         school_year=args.school_year)
+        print('{} of {} issues in the requested dates'.format(len(paths),
+                                                              num_paths))
+
+    # only process issues that are new or changed since the last run
+    manifest = None
+    if args.manifest_file and not args.metric_flag:
+        # changing the output settings invalidates every recorded issue
+        hashes = tagger_hashes()
+        hashes['output'] = sink.config()
+        manifest = Manifest.load(args.manifest_file, hashes)
+        num_paths = len(paths)
+        paths = manifest.changed(paths)
+        print('{} of {} issues unchanged, skipping'.format(
+            num_paths - len(paths), num_paths))
 
     # columns for data frames
     columns = ["page", "article", "function", "paragraph", "jump", "ad", "text"]
 
-    # generate list of untagged Issues()
-    issue_list = gen_issue_list(args, paths, columns)
+    # time each stage of each issue if profiling
+    profile = Profile() if args.profile_file else None
+
+    # generate untagged Issues() lazily, one file at a time
+    issues = iter_issues(paths, columns, raw_data=args.raw_data,
+                         packed=packed)
+    if profile:
+        issues = profile.timed_iter('load', issues)
 
     # add supplemental coordinate data from tesseract
     if args.raw_data and args.coord:
         import ocrmerge
-        ocrmerge.get_location_data(issue_list,
+        issues = list(issues)
+        ocrmerge.get_location_data(issues,
                                    image_dir="image_data",
                                    hocr_dir="hOCR_data")
 
 
-    # If running raw data, tag all data with taggers and return in list
+    # If running raw data, tag each issue with the taggers as it is read
     if args.raw_data:
-        tagged_issue_objs = run_taggers(issue_list)
+        stage_cache = None
+        if args.stage_cache_dir:
+            stage_cache = StageCache(args.stage_cache_dir,
+                                     [name for (name, _) in TAGGERS])
+        tagged_issue_objs = run_taggers(issues, jobs=args.jobs,
+                                        stage_cache=stage_cache,
+                                        from_stage=args.from_stage,
+                                        profile=profile)
     else:
-        tagged_issue_objs = issue_list
-
-    # if running metrics, don't output to JSON, output results of metrics.
-    if args.metric_flag:
-        run_metrics(tagged_issue_objs, columns)
-        sys.exit(0)
-
-    # create dictionary for tagged issues
-    issue_dict = gen_issue_dict(args, tagged_issue_objs)
-
-    # output all data to JSON - one JSON file per article
-    json_dump(issue_dict)
+        tagged_issue_objs = issues
 
+    try:
+        # if running metrics, don't output to JSON, output results of metrics.
+        if args.metric_flag:
+            run_metrics(tagged_issue_objs, columns)
+            sys.exit(0)
+
+        # reconstruct and output each issue as soon as it is tagged. Issues
+        # come out in the same order as paths.
+        for path, (pub_info, issue_obj) in zip(paths, tagged_issue_objs):
+            with timed(profile, 'reconstruct', issue_obj):
+                articles = reconstruct_issue(issue_obj, pub_info,
+                                             args.tagged_data)
+            with timed(profile, 'write', issue_obj):
+                outputs = sink.write(pub_info, articles)
+            if manifest:
+                manifest.record(path, outputs)
+    finally:
+        sink.close()
+        if manifest:
+            manifest.save()
+        if profile:
+            profile.write(args.profile_file)
+
+
+def reconstruct_iter(paths, raw_data=True, jobs=1):
+    '''Reconstruct the articles of every issue in paths, yielding
+       (pub_info, [article dicts]) one issue at a time. paths are raw ABBYY
+       .txt files if raw_data, else manually tagged .csv files. Only the
+       issue currently being processed (or one per worker with jobs > 1) is
+       held in memory.'''
+    issues = iter_issues(paths, Issue.COLUMNS, raw_data=raw_data)
+
+    if raw_data:
+        issues = run_taggers(issues, jobs=jobs)
+
+    return reconstruct_issues(issues)
+
+
+def reconstruct_issues(issues, interactive=False):
+    '''Generate (pub_info, [article dicts]) for each tagged issue.'''
+    for (pub_info, issue_obj) in issues:
+        yield (pub_info, reconstruct_issue(issue_obj, pub_info, interactive))
+
+
+def reconstruct_issue(issue_obj, pub_info, interactive=False):
+    '''Return the article dicts of a single tagged issue.'''
+    issue_df = construct_tagged(issue_obj, pub_info, interactive)
+
+    return issue_df.to_dict('records')
+
+
+def run_taggers(issues, jobs=1, stage_cache=None, from_stage=None,
+                profile=None):
+    '''Run every issue through the tagger chain, yielding tagged issues in
+       the same order as issues. With jobs > 1 the issues are fanned out to a
+       pool of worker processes. See tag_issue() for stage_cache and
+       from_stage. If profile is a Profile(), the time each tagger took on
+       each issue is added to it.'''
+    tag_issue_with_cache = functools.partial(tag_issue,
+                                             stage_cache=stage_cache,
+                                             from_stage=from_stage,
+                                             profile=profile is not None)
+    if jobs > 1:
+        # load the classifiers once here so forked workers inherit them
+        preload_classifiers()
+        with multiprocessing.Pool(processes=jobs) as pool:
+            tagged = imap_bounded(pool, tag_issue_with_cache, issues,
+                                  max_in_flight=jobs * IN_FLIGHT_PER_JOB)
+            yield from debug_tagged(tagged, profile)
+    else:
+        yield from debug_tagged((tag_issue_with_cache(item) for item in issues),
+                                profile)
 
-def run_taggers(issue_list):
-    # taggers
-    taggers = [pbt.tag, blt.tag, hlt.tag, jkt.tag, ttt.tag, jpt.tag, ant.tag]
 
-    tagged_results = []
+def debug_tagged(tagged, profile=None):
+    '''Pass tagged issues through, collecting the timings tag_issue()
+       recorded on them and pausing on each one when debugging.'''
+    for (pub_info, issue_obj) in tagged:
+        if profile:
+            profile.add(issue_obj)
 
-    for (pub_info, issue_obj) in issue_list:
-        for tag in taggers:
-            issue_obj = tag(issue_obj)
         if DEBUG:
             print (issue_obj.tags_df)
             input('Dataframe output above for debugging. Press any key to \
                    continue')
 
-        # add tagged issue to results
-        tagged_results.append((pub_info, issue_obj))
+        yield (pub_info, issue_obj)
 
-    return tagged_results
 
+def tag_issue(item, stage_cache=None, from_stage=None, profile=False):
+    '''Apply all taggers to a single (pub_info, Issue()) pair. Runs in a
+       worker process when tagging with --jobs. The taggers share and rewrite
+       the issue's tags_df in place rather than each copying it.
 
-def gen_issue_dict(args, issue_list):
-    issue_dict = {}
-    for (pub_info, issue_obj) in issue_list:
-        issue_df = construct_tagged(issue_obj, pub_info, args)
+       With a StageCache, tagging resumes after the latest stage whose output
+       is cached, and the output of every stage that runs is cached. Stages
+       from from_stage on are always rerun.
+
+       If profile, the time each stage took is left in issue_obj.timings.'''
+    (pub_info, issue_obj) = item
+    names = [name for (name, _) in TAGGERS]
+    start = 0
+    stage_profile = Profile() if profile else None
+
+    if stage_cache:
+        with timed(stage_profile, 'stage_cache', issue_obj):
+            keys = stage_cache.keys(issue_obj)
+            last = names.index(from_stage) if from_stage else len(TAGGERS)
+            for i in reversed(range(last)):
+                tags_df = stage_cache.load(names[i], keys[i])
+                if tags_df is not None:
+                    issue_obj.tags_df = tags_df
+                    start = i + 1
+                    break
 
-        issue_dict[pub_info] = issue_df.to_dict('records')
+    for i in range(start, len(TAGGERS)):
+        (name, tag) = TAGGERS[i]
+        with timed(stage_profile, name, issue_obj):
+            issue_obj = tag(issue_obj, inplace=True)
+        if stage_cache:
+            stage_cache.save(name, keys[i], issue_obj.tags_df)
 
-    return issue_dict
+    if stage_profile:
+        issue_obj.timings.extend(stage_profile.records)
+
+    return (pub_info, issue_obj)
+
+
+def imap_bounded(pool, func, iterable, max_in_flight):
+    '''Ordered pool.imap() that never has more than max_in_flight items
+       submitted but not yet consumed, so memory stays flat however long
+       iterable is.'''
+    pending = collections.deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def gen_issue_dict(args, issue_list):
+    return dict(reconstruct_issues(issue_list, args.tagged_data))
 
 
 def gen_issue_list(args, paths, columns):
-    issue_list = []
+    return list(iter_issues(paths, columns, raw_data=args.raw_data))
+
 
-    # generate a list of Issue() objects to work with
+def iter_issues(paths, columns, raw_data=True, packed=None):
+    '''Generate (pub_info, Issue()) pairs, reading each file only when the
+       next issue is requested. If packed is a corpus.Corpus, paths are the
+       names of issues in it.'''
     for path in paths:
         # strip publication information from file name
         pub_info = get_pub_info(path)
 
-        if args.raw_data:
-            # read in raw txt and convert to df
-            df = gen_blank_df(path, columns)
-
-        elif args.tagged_data:
-            # read in the csv file and store as df
-            df = pd.read_csv(path, header=2, names=columns)
+        if packed is not None:
+            issue_obj = Issue(packed.issue_df(path, columns), path)
 
-        issue_obj = Issue(df, path)
+        elif raw_data:
+            # read in raw txt and convert to df
+            issue_obj = Issue(gen_blank_df(path, columns), path)
 
-        # Add to list with publication info
-        issue_list.append((pub_info, issue_obj))
+        else:
+            # the csv file is parsed once and cached. It is read here rather
+            # than when first used, so profiling counts it as loading.
+            issue_obj = Issue(groundtruth.load_tagged(path), path)
 
-    return issue_list
+        yield (pub_info, issue_obj)
 
 
 def gen_blank_df(txt_path, columns):
     '''Given the path for a single text file, create a data frame for that
        contains its text in the text column.'''
-    # create an empty data frame
-    df = pd.DataFrame(columns=columns)
-
-    # gata data in lines variable
-    with open(txt_path, 'r', encoding="utf-8") as file_in:
-        lines = [line.rstrip("\n") for line in file_in.readlines()]
-
-    df['text'] = lines
-
-    # print (df)
-    return df
+    return corpus.load_issue(txt_path, columns)
 
 
 def get_pub_info(file_name):
@@ -186,6 +360,104 @@ def setup_args():
                         dest='coord',
                         help='Flag to use coordinate data (experimental)')
 
+    parser.add_argument('--jobs',
+                        metavar='N',
+                        type=int,
+                        default=1,
+                        dest='jobs',
+                        help='Number of worker processes used to tag raw \
+                              issues in parallel (default: 1).')
+
+    parser.add_argument('--stage-cache',
+                        metavar='DIR',
+                        default=None,
+                        dest='stage_cache_dir',
+                        help='Cache the output of each tagger stage in DIR \
+                              and resume each issue after the latest stage \
+                              whose output is still valid.')
+
+    parser.add_argument('--from-stage',
+                        metavar='NAME',
+                        choices=[name for (name, _) in TAGGERS],
+                        default=None,
+                        dest='from_stage',
+                        help='With --stage-cache, rerun stage NAME and every \
+                              stage after it even if cached. One of: \
+                              {}.'.format(', '.join(name for (name, _)
+                                                    in TAGGERS)))
+
+    parser.add_argument('--profile',
+                        metavar='FILE',
+                        default=None,
+                        dest='profile_file',
+                        help='Write the wall time, CPU time and lines/sec of \
+                              each stage of each issue to FILE as JSON, and \
+                              a Prometheus textfile summary next to it with \
+                              a .prom extension.')
+
+    parser.add_argument('--manifest',
+                        metavar='FILE',
+                        default=None,
+                        dest='manifest_file',
+                        help='Record processed issues in FILE and skip issues \
+                              whose input and taggers have not changed since \
+                              they were recorded. Output files an issue no \
+                              longer produces are deleted.')
+
+    parser.add_argument('--start-date',
+                        metavar='YYYY-MM-DD',
+                        type=issuedates.parse_date,
+                        default=None,
+                        dest='start_date',
+                        help='Only process issues published on or after this \
+                              date, according to newspaper_dates.csv.')
+
+    parser.add_argument('--end-date',
+                        metavar='YYYY-MM-DD',
+                        type=issuedates.parse_date,
+                        default=None,
+                        dest='end_date',
+                        help='Only process issues published on or before this \
+                              date, according to newspaper_dates.csv.')
+
+    parser.add_argument('--school-year',
+                        metavar='YYYY[-YYYY]',
+                        type=issuedates.parse_school_year,
+                        default=None,
+                        dest='school_year',
+                        help='Only process issues of the school year starting \
+                              in YYYY, e.g. 1983 or 1983-1984, according to \
+                              newspaper_dates.csv.')
+
+    parser.add_argument('--output-format',
+                        choices=sinks.FORMATS,
+                        default='json',
+                        dest='output_format',
+                        help='json: one file per article (default); jsonl: \
+                              one file per issue, one article per line; \
+                              parquet: a dataset of one file per issue; \
+                              sqlite: an articles table in articles.sqlite.')
+
+    parser.add_argument('--output-dir',
+                        metavar='DIR',
+                        default='json_output',
+                        dest='output_dir',
+                        help='Directory to write articles to (default: \
+                              json_output).')
+
+    parser.add_argument('--shard-by',
+                        choices=sinks.SHARDS,
+                        default=None,
+                        dest='shard_by',
+                        help='Write each year or each issue to its own \
+                              subdirectory of the output directory.')
+
+    parser.add_argument('--compress',
+                        action='store_true',
+                        dest='compress',
+                        help='gzip json and jsonl output; use gzip instead of \
+                              snappy for parquet. Ignored for sqlite.')
+
     req = parser.add_argument_group('required arguments')
 
     req.add_argument('--data',
@@ -200,51 +472,56 @@ def setup_args():
 
 
 
-def construct_tagged(issue_obj, pub_info, args):
+def construct_tagged(issue_obj, pub_info, interactive=False):
     '''Reconstruct all articles of a single issue from a manually tagged csv
-       file. Add to issue_dict.'''
+       file. If interactive, show the result and wait for a key press.'''
     # get the tagged df from the Issue()
     issue = issue_obj.tags_df
 
-    # get the article numbers
-    article_nums = issue[(issue.article.notnull()) &
-                         (issue.article != 0)].article.unique()
-    articles = []
+    # get the rows of every article, in issue order
+    rows = issue[(issue.article.notnull()) & (issue.article != 0)]
+    article_nums = rows.article.unique()
+
+    # grab the issue date and details from external spreadsheet
+    issue_info = get_issue_info(issue_obj)
+    article_date = issue_info.get('pub_date')
+
+    if DEBUG:
+        for (_, article) in rows.groupby('article', sort=False):
+            check_article(article)
 
-    # grab the issue date from external spreadsheet
-    article_date = get_date(issue_obj)
+    # extract each field of every article in one pass over the issue
+    headlines = get_headlines(rows)
+    authors = get_bylines(rows)
+    texts = get_texts(rows)
+    pages = get_pages(rows)
+    num_paragraphs = get_num_paragraphs(rows)
 
     # populate article data
+    articles = []
     for n in article_nums:
-        article = issue[issue.article == n]
-        if len(article) > 0:
-            if DEBUG: check_article(article)
-            headline = get_headline(article)
-            author = get_byline(article)
-            text = get_text(article)
-            pages = get_pages(article)
-            article_number = str(article.article.values[0])
-            num_paragraphs = get_num_paragraphs(article)
-            id_num = get_id()
-            article_data = {"id": id_num,
-                            "publication" : pub_info,
-                            "article_date": article_date,
-                            "article_headline": headline,
-                            "page_number": pages,
-                            "author": author,
-                            "article_number": article_number,
-                            "article_text": text,
-                            "article_subheading": '',
-                            "number_of_paragraphs":num_paragraphs,
-                            "link_image": [],
-                            "link_article": []}
+        article_data = {"id": get_id(issue_obj, pub_info, n),
+                        "publication" : pub_info,
+                        "article_date": article_date,
+                        "volume": issue_info.get('volume'),
+                        "issue_number": issue_info.get('issue'),
+                        "school_year": issue_info.get('school_year'),
+                        "article_headline": headlines.get(n),
+                        "page_number": pages.get(n),
+                        "author": authors.get(n),
+                        "article_number": str(n),
+                        "article_text": texts.get(n, ''),
+                        "article_subheading": '',
+                        "number_of_paragraphs": str(num_paragraphs.get(n, 0)),
+                        "link_image": [],
+                        "link_article": []}
 
         articles.append(pd.Series(article_data))
 
     issue_df = pd.DataFrame(articles, index=range(1, len(articles) + 1))
     issue_df.index.name = "id"
 
-    if args.tagged_data:
+    if interactive:
         print (issue_df)
         input('\n\n Reconstructed issue shown above in dataframe. Press any '\
               'key to continue. CTRL-C to quit.')
@@ -254,35 +531,41 @@ def construct_tagged(issue_obj, pub_info, args):
 
 def json_dump(issue_dict):
     '''Dump an entire issue to JSON, creating a separate JSON file for
-       each article.'''
-    # Add command line argument to specify a directory output
-    directory = "json_output/"
+       each article. Returns the names of the files written.'''
+    sink = sinks.JsonSink("json_output")
+
+    file_names = []
 
     # issue_dict is a dictionary of {pub_info : [articles]}
     for key, articles in issue_dict.items():
-        for article in articles:
-            article_num = article['article_number']
-            file_name = directory + key + "_" + article_num + '.json'
-            with open(file_name, 'w') as json_out:
-                json.dump(article, json_out, indent=4, ensure_ascii=False)
+        file_names.extend(sink.write(key, articles))
 
+    return file_names
 
-id_count = 0
-def get_id():
-    global id_count
-    id_count += 1
-    return str(id_count)
 
+def get_id(issue_obj, pub_info, article_number):
+    '''Return an article ID built from the issue's spreadsheet Identifier,
+       its publication info and the article number, e.g.
+       ua-nws_00003203_1983-47-118_7. The same article gets the same ID in
+       every run, whatever order or process issues are reconstructed in.'''
+    parts = [issuedates.identifier(issue_obj.filename), pub_info,
+             str(article_number)]
+    return '_'.join(part for part in parts if part)
 
-def get_num_paragraphs(article):
-    paragraph_nums = article.paragraph[article.paragraph != 0].unique().tolist()
-    return str(len(paragraph_nums))
+
+def get_num_paragraphs(rows):
+    '''Return {article number: number of distinct non-zero paragraphs}.'''
+    # untagged paragraphs count as one paragraph, as NaN always did
+    paragraphs = rows[(rows.paragraph != 0).fillna(True)].drop_duplicates(
+        ['article', 'paragraph'])
+    return collections.Counter(paragraphs.article)
 
 
 def check_article(article):
     '''Assertions to confirm the article is tagged as expected'''
     # check correct paragraph ordering
-    paragraph_nums = article.paragraph[article.paragraph != 0].unique().tolist()
+    paragraph_nums = article.paragraph[(article.paragraph != 0).fillna(True)]\
+        .unique().tolist()
     lst = list(range(1, len(paragraph_nums) + 1))
     if paragraph_nums != lst:
         article_num = article.article.unique()[0]
@@ -293,69 +576,55 @@ def check_article(article):
         print ('\n')
 
 
-def get_date(issue_obj):
-    '''Look up the issue date in an external spreadsheet.'''
-    # external spreadsheet
-    file_name = 'newspaper_dates.csv'
-    # read spreadsheet into dataframe
-    date_df = pd.read_csv(file_name)
+def get_issue_info(issue_obj):
+    '''Look up the issue's date, volume, issue number, page count and school
+       year in an external spreadsheet, which is only read once per process.
+       Returns an empty dict for issues missing from the spreadsheet.'''
+    info = issuedates.load().get(issue_obj.filename)
+    if info is None:
+        if DEBUG: print ('No date found for ', issue_obj.filename)
+        return {}
+    return info
 
-    try:
-        # use re to get the issue information needed for lookup
-        match = re.search('ua-nws_\d{8}', issue_obj.filename)
-        if match:
-            name = match.group(0)
 
-        # use issue information to index into dataframe row that contains date
-        row = date_df.loc[date_df['Identifier'] == name]
-
-        # parse date from row above
-        art_date = row['pub_date'].values[0]
-    except Exception as e:
-        if DEBUG: print ('Date exception: ', e)
-        art_date = None
-
-    return art_date
-
-
-def get_text(article):
-    '''Return joined article text.'''
-    # sort article by paragraph numbering before join
-    article.sort_values(by='paragraph', ascending=True)
+def get_texts(rows):
+    '''Return {article number: joined article text}, with each article's
+       text lines in paragraph order.'''
+    # stable sort, so lines of the same paragraph keep their order
+    text = rows[rows.function == "TXT"].sort_values(by='paragraph',
+                                                     kind='mergesort')
 
     # reconstruct text in order.
-    return " ".join(article[article.function == "TXT"].text.values)
+    return text.groupby('article', sort=False).text.agg(" ".join).to_dict()
 
 
-def get_headline(article):
-    '''Extract headline from article.'''
-    try:
-        headline = article[article.function == "HL"].text.values[0]
-    except Exception as e:
-        if DEBUG: print ('Headline exception: ', e)
-        headline = None
-
-    return headline
+def get_headlines(rows):
+    '''Return {article number: first headline of the article}.'''
+    headlines = rows[rows.function == "HL"].drop_duplicates('article')
+    return dict(zip(headlines.article, headlines.text))
 
 
-def get_byline(article):
-    '''Extract author from article.'''
-    try:
-        author = article[article.function == "BL"].text.values[0]
-    except Exception as e:
-        if DEBUG: print ('Byline exception: ', e)
-        author = None
+def get_bylines(rows):
+    '''Return {article number: first byline of the article}.'''
+    bylines = rows[rows.function == "BL"].drop_duplicates('article')
+    return dict(zip(bylines.article, bylines.text))
 
-    return author
 
+def get_pages(rows):
+    '''Return {article number: comma separated pages the article is on, in
+       the order they appear}.'''
+    article_pages = {}
+    unique_pages = rows.drop_duplicates(['article', 'page'])
+    for (n, page) in zip(unique_pages.article, unique_pages.page):
+        article_pages.setdefault(n, []).append(page)
 
-def get_pages(article):
-    '''Extract pages from article.'''
-    try:
-        pages = str(list(map(int, article.page.unique()))).strip('[]')
-    except Exception as e:
-        if DEBUG: print ('Page exception: ', e)
-        pages = None
+    pages = {}
+    for (n, page_list) in article_pages.items():
+        try:
+            pages[n] = str(list(map(int, page_list))).strip('[]')
+        except Exception as e:
+            if DEBUG: print ('Page exception: ', e)
+            pages[n] = None
 
     return pages
 
@@ -369,8 +638,10 @@ def set_pd_options():
 def run_metrics(issue_list, columns):
     function_results = []   # (pub_info, precision, recall)
     article_results = []
+    # counts of every pair of tags over every issue
+    corpus_matrix = metrics.ConfusionMatrix()
     # get the tagged data files and create dfs
-    tagged_paths = glob.glob('tagged_data/*.csv')
+    tagged_paths = groundtruth.paths()
 
     for (pub_info, issue_obj) in issue_list:
         issue_obj = tag_junk(issue_obj)
@@ -381,18 +652,17 @@ def run_metrics(issue_list, columns):
                 break
 
         # open the tagged path as a df
-        tagged_df = pd.read_csv(tagged_fname,
-                                skiprows=[0,1],
-                                header=None,
-                                names=columns)
+        tagged_df = groundtruth.load_tagged(tagged_fname)
 
         # convert tags to JNK
         tagged_issue = tag_junk(Issue(tagged_df), replace_nan=True)
 
         # pass the two dataframes to comparison functions
-        precision,recall = compare_dfs(issue_obj.tags_df, tagged_issue.tags_df,
-                                       pub_info)
+        matrix = compare_dfs(issue_obj.tags_df, tagged_issue.tags_df,
+                             pub_info)
+        precision,recall = matrix.summary()
         function_results.append((pub_info, precision, recall))
+        corpus_matrix += matrix
 
     # write results to file
     with open('metrics.txt', 'w') as file_out:
@@ -410,6 +680,17 @@ def run_metrics(issue_list, columns):
 
         file_out.write('\n\n')
 
+        # every line of every issue counted together
+        corpus_prec, corpus_rec = corpus_matrix.summary()
+        file_out.write('Corpus precision: {:03f}\n'.format(corpus_prec))
+        file_out.write('Corpus recall: {:03f}\n'.format(corpus_rec))
+        file_out.write('\n')
+        file_out.write(corpus_matrix.report().to_string(float_format='{:.3f}'.format))
+        file_out.write('\n\n')
+        file_out.write('Confusion matrix (expected down, actual across):\n')
+        file_out.write(corpus_matrix.to_df().to_string())
+        file_out.write('\n')
+
 
 def extract_data(lst, tuple_val, key_name):
     return [v[tuple_val] for dic in lst for k,v in dic.items() if k == key_name]
@@ -434,56 +715,27 @@ def calc_avg(lst):
 
 
 def compare_dfs(raw_df, tagged_df, pub_info):
-    '''Compare dfs line by line looking at various components to see how
-       accurate they are.'''
-    # assert dataframes have the same number of rows
-    if len(raw_df.index) != len(tagged_df.index):
-        print ('df size not equal {}'.format(pub_info))
-        return (None, None)
-
-    true_pos = 0    # row tagged correctly
-    false_pos = 0   # row tagged incorrectly
-    false_negs = 0  # row not tagged
-
-    for i in range(len(raw_df.index)):
-        # assert a text match to continue
-        raw_text = str(raw_df.loc[i,'text'])
-        tagd_text = str(tagged_df.loc[i+1,'text'])
-        if i < 20 and raw_text and tagd_text != 'nan':
-            fuzz_ratio = fuzz.partial_ratio(raw_text, tagd_text)
-            assert fuzz_ratio >= 50, "row {} - text not equal: ^{}^:^{}^\n\
-                ratio: {}".format(i, raw_text, tagd_text, fuzz_ratio)
-
-        # get the function tags
-        raw_func_tag = raw_df.loc[i,'function']
-        tagd_func_tag = tagged_df.loc[i+1,'function']
-
-        # if not tag for raw_func_tag, false negative
-        if not raw_func_tag:
-            false_negs += 1
-            continue
-
-        # check if tags match
-        if raw_func_tag == tagd_func_tag:
-            true_pos += 1
-        else:
-            false_pos += 1
-
-    # double check we counted every row
-    assert true_pos + false_pos + false_negs == len(raw_df.index), 'missing \
-        counts of some data, true_pos {}, false_pos: {}, false_negs {}'\
-        .format(true_pos, false_pos, false_negs)
+    '''Compare the function tags of a tagged issue with its manually tagged
+       version line by line, after aligning their lines by text. Returns a
+       metrics.ConfusionMatrix of the aligned lines.'''
+    raw_positions, tagged_positions = align.align_rows(raw_df.text.values,
+                                                       tagged_df.text.values)
 
-    precision = true_pos / (true_pos + false_pos)
-    recall = true_pos / (true_pos + false_negs)
+    num_raw = len(raw_df.index) - len(raw_positions)
+    num_tagged = len(tagged_df.index) - len(tagged_positions)
+    if num_raw or num_tagged:
+        print ('{} raw and {} tagged lines not aligned {}'.format(
+            num_raw, num_tagged, pub_info))
 
-    return precision,recall
+    # count every pair of tags at once
+    return metrics.ConfusionMatrix().add(
+        tagged_df.function.values[tagged_positions],
+        raw_df.function.values[raw_positions])
 
 
 def article_completeness(raw_df, tagged_df):
     '''Check articles to see if headlines, bylines, and paragraph text are
        correct.'''
-
     # get the article numbers
     article_nums = tagged_df[(tagged_df.article.notnull()) &
                          (tagged_df.article != 0)].article.unique().tolist()
@@ -492,8 +744,8 @@ def article_completeness(raw_df, tagged_df):
     tagged_articles = []
     raw_articles = []
     for n in article_nums:
-        article = tagged_df[(tagged_df.article == n) & tagged_df['function']
-            .isin(['TXT', 'HL', 'BL'])]
+        article = tagged_df[(tagged_df.article == n).fillna(False) &
+            tagged_df['function'].isin(['TXT', 'HL', 'BL'])]
         tagged_articles.append(article)
 
     # get all raw articles numbers
@@ -501,138 +753,80 @@ def article_completeness(raw_df, tagged_df):
                          (raw_df.article != 0)].article.unique().tolist()
 
     for n in article_nums:
-        article = raw_df[(raw_df.article == n) & raw_df['function']
-            .isin(['TXT', 'HL', 'BL'])]
+        article = raw_df[(raw_df.article == n).fillna(False) &
+            raw_df['function'].isin(['TXT', 'HL', 'BL'])]
         raw_articles.append(article)
 
-    # try to match up articles based on text values
-    found_matching = False
+    # pair each tagged article with at most one raw article, the pairing
+    # with the most similar text overall
+    tagged_strs = [join_text(article) for article in tagged_articles]
+    raw_strs = [join_text(article) for article in raw_articles]
     results = []
 
-    for tval, tag_art in enumerate(tagged_articles):
-        tagd_text_list = tag_art['text'].tolist()
-        tagd_str = ' '.join(tagd_text_list)
-        for rval, raw_art in enumerate(raw_articles):
-            raw_text_list = raw_art['text'].tolist()
-            raw_str = ' '.join(raw_text_list)
-            fr = fuzz.ratio(raw_str, tagd_str)
-            if fr > 80:
-                results_dict = compare_articles(raw_art, tag_art)
-                results.append(results_dict)
+    for (tval, rval, fr) in matching.match(tagged_strs, raw_strs):
+        results_dict = compare_articles(raw_articles[rval],
+                                        tagged_articles[tval])
+        results.append(results_dict)
 
     return results
 
 
 def pair_similar(raw_articles, tagged_articles):
-    '''For every article in tagged, find most similar in raw, return paired.'''
-    tag_id = [(i,t) for i,t in enumerate(tagged_articles)]
-    raw_id = [(i,t) for i,t in enumerate(raw_articles)]
-    results = []
-
-    for tid, tag_art in enumerate(tagged_articles):
-        tagd_text_list = tag_art['text'].tolist()
-        tagd_str = ' '.join(tagd_text_list)
-        for rid, raw_art in enumerate(raw_articles):
-            raw_text_list = raw_art['text'].tolist()
-            raw_str = ' '.join(raw_text_list)
-            fr = fuzz.ratio(raw_str, tagd_str)
-            results.append((tid, rid, fr))
+    '''For every article in tagged, find the most similar candidates in raw,
+       return (tagged index, raw index, ratio) sorted by tagged index and
+       ratio.'''
+    tagged_strs = [join_text(article) for article in tagged_articles]
+    raw_strs = [join_text(article) for article in raw_articles]
 
+    results = matching.similar_pairs(tagged_strs, raw_strs, threshold=0)
     results.sort(key=lambda tup: (tup[0], tup[2]))
 
     return results
 
 
-def calc_prec_recall(true_pos, false_pos, false_negs):
-    if (true_pos + false_pos) == 0:
-        precision = 0
-    else:
-        precision = true_pos / (true_pos + false_pos)
-    if (true_pos + false_negs) == 0:
-        recall = 0
-    else:
-        recall = true_pos / (true_pos + false_negs)
-    return precision, recall
+def join_text(article):
+    '''Return the text of an article's lines as one string.'''
+    return ' '.join(article['text'].dropna().astype(str))
+
+
+def get_function_texts(article, function):
+    '''Return the text of an article's lines tagged function.'''
+    return article[article['function'] == function].text.dropna()\
+        .astype(str).tolist()
 
 
 def compare_articles(raw_article, tagged_article):
-    '''Given two articles represented as dataframes, compare them.'''
+    '''Given two articles represented as dataframes, compare them. Each
+       tagged headline, byline and text line is paired with at most one
+       similar raw line of the same kind.'''
     results = {}
 
-    raw_hl_lst = raw_article[(raw_article['function'] == 'HL')].text.values
-    raw_bl_lst = raw_article[(raw_article['function'] == 'BL')].text.values
-    raw_txt_lst = raw_article[(raw_article['function'] == 'TXT')].text.values
-
-    raw_tuple_vals = []
-    i = 1
-    for item in raw_txt_lst:
-        raw_tuple_vals.append((i, item))
-        i += 1
-
-    tagged_hl_lst = tagged_article[(tagged_article['function'] == 'HL')]\
-        .text.values
-    tagged_bl_lst = tagged_article[(tagged_article['function'] == 'BL')]\
-        .text.values
-    tagged_txt_lst = tagged_article[(tagged_article['function'] == 'TXT')]\
-        .text.values
-
-    tagged_tuple_vals = []
-    i = 1
-    for item in tagged_txt_lst:
-        tagged_tuple_vals.append((i, item))
-        i += 1
-
-    hl_match = 0
-    hl_tp = 0
-    hl_fp = 0
-    hl_fn = 0
-    for tagh in tagged_hl_lst:
-        matched = False
-        for rawh in raw_hl_lst:
-            if fuzz.ratio(tagh, rawh) > 80:
-                hl_tp += 1
-                hl_match += 1
-                matched = True
-        hl_fp = len(raw_hl_lst) - hl_match
-        if not matched:
-            hl_fn += 1
-
-    bl_match = 0
-    bl_tp = 0
-    bl_fp = 0
-    bl_fn = 0
-    for tagb in tagged_bl_lst:
-        matched = False
-        for rawb in raw_bl_lst:
-            if fuzz.ratio(tagb, rawb) > 80:
-                bl_tp += 1
-                bl_match += 1
-                matched = True
-        bl_fp = len(raw_bl_lst) - bl_match
-        if not matched:
-            bl_fn += 1
-
-    txt_match = 0
-    num_in_order = 0
-    txt_tp = 0
-    txt_fp = 0
-    txt_fn = 0
-    for (tag_num, tag_txt) in tagged_tuple_vals:
-        matched = False
-        for (raw_num, raw_txt) in raw_tuple_vals:
-            if fuzz.ratio(tag_txt, raw_txt) > 80:
-                txt_tp += 1
-                txt_match += 1
-                matched = True
-                if tag_num == raw_num:
-                    num_in_order += 1
-        txt_fp = len(raw_tuple_vals) - txt_match
-        if not matched:
-            txt_fn += 1
-
-    hl_precision, hl_recall = calc_prec_recall(hl_tp, hl_fp, hl_fn)
-    bl_precision, bl_recall = calc_prec_recall(bl_tp, bl_fp, bl_fn)
-    txt_precision, txt_recall = calc_prec_recall(txt_tp, txt_fp, txt_fn)
+    raw_hl_lst = get_function_texts(raw_article, 'HL')
+    raw_bl_lst = get_function_texts(raw_article, 'BL')
+    raw_txt_lst = get_function_texts(raw_article, 'TXT')
+
+    tagged_hl_lst = get_function_texts(tagged_article, 'HL')
+    tagged_bl_lst = get_function_texts(tagged_article, 'BL')
+    tagged_txt_lst = get_function_texts(tagged_article, 'TXT')
+
+    hl_tp = len(matching.match(tagged_hl_lst, raw_hl_lst))
+    hl_fp = len(raw_hl_lst) - hl_tp
+    hl_fn = len(tagged_hl_lst) - hl_tp
+
+    bl_tp = len(matching.match(tagged_bl_lst, raw_bl_lst))
+    bl_fp = len(raw_bl_lst) - bl_tp
+    bl_fn = len(tagged_bl_lst) - bl_tp
+
+    txt_pairs = matching.match(tagged_txt_lst, raw_txt_lst)
+    txt_tp = len(txt_pairs)
+    txt_fp = len(raw_txt_lst) - txt_tp
+    txt_fn = len(tagged_txt_lst) - txt_tp
+    num_in_order = sum(1 for (tag_num, raw_num, _) in txt_pairs
+                       if tag_num == raw_num)
+
+    hl_precision, hl_recall = metrics.calc_prec_recall(hl_tp, hl_fp, hl_fn)
+    bl_precision, bl_recall = metrics.calc_prec_recall(bl_tp, bl_fp, bl_fn)
+    txt_precision, txt_recall = metrics.calc_prec_recall(txt_tp, txt_fp, txt_fn)
 
     if any(tagged_txt_lst):
         txt_order_ratio = num_in_order / len(tagged_txt_lst)
@@ -1,21 +1,54 @@
 import sys
-from os import listdir
-from os.path import isfile, join
-from urllib.parse import urlencode
+import gzip
+from os import walk
+from os.path import join
+from urllib.parse import quote, urlencode
 from urllib.request import Request, urlopen
 import cgi
 import json
 import requests
 
+# articles sent per bulk request when indexing .jsonl files
+BULK_SIZE = 500
+
 def indexData(directory, url):
-    all_files = [join(directory, f) for f in listdir(directory) if isfile(join(directory, f))]
+    # walk subdirectories too, for output sharded with --shard-by
+    all_files = sorted(join(root, f) for root, dirs, files in walk(directory) for f in files)
     for file_name in all_files:
-        with open(file_name, 'r') as content_file:
-            content = content_file.read()
-            r = requests.post(url, data=content.encode(encoding='utf-8'))
-            #print(r.status_code, r.reason)  # HTTP
+        if file_name.endswith(('.jsonl', '.jsonl.gz')):
+            indexLines(file_name, url)
+        elif file_name.endswith(('.json', '.json.gz')):
+            with openText(file_name) as content_file:
+                content = content_file.read()
+                # index under the article's id, so reindexing replaces it
+                r = requests.put(url + "/" + quote(json.loads(content)["id"], safe=''),
+                                 data=content.encode(encoding='utf-8'))
+                #print(r.status_code, r.reason)  # HTTP
     print("Indexing Done")
 
+def indexLines(file_name, url):
+    # one article per line, sent BULK_SIZE at a time through the bulk API
+    batch = []
+    with openText(file_name) as content_file:
+        for line in content_file:
+            if line.strip():
+                action = {"index": {"_id": json.loads(line)["id"]}}
+                batch.append(json.dumps(action) + '\n' + line.rstrip('\n') + '\n')
+            if len(batch) == BULK_SIZE:
+                postBulk(batch, url)
+                batch = []
+    if batch:
+        postBulk(batch, url)
+
+def postBulk(batch, url):
+    r = requests.post(url + "/_bulk", data="".join(batch).encode(encoding='utf-8'))
+    #print(r.status_code, r.reason)  # HTTP
+
+def openText(file_name):
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, 'rt', encoding='utf-8')
+    return open(file_name, 'r')
+
 def createIndex(url, settings):
     d = requests.delete(url)
     r = requests.post(url, data=settings.encode(encoding='utf-8'))
@@ -29,8 +62,13 @@ def search(url):
 
 def main(argv):
 
+    # --update adds and replaces articles in the existing index instead of
+    # rebuilding it from scratch
+    update = "--update" in argv
+    argv = [arg for arg in argv if arg != "--update"]
+
     if (len(argv) < 2):
-        print("Usage : Python ES.py data_dir ")
+        print("Usage : Python ES.py [--update] data_dir ")
         #python ES.py /NLP/Project_ArticleR/json_output http://localhost:9200/sample/ /NLP/Project_ArticleR/Mapping.txt
         return
 
@@ -40,7 +78,8 @@ def main(argv):
     with open(settings_file, 'r') as settings_f:
         settings = settings_f.read()
 
-    createIndex(url, settings)
+    if not update:
+        createIndex(url, settings)
     indexData(data_dir, url + "/article_search")
 
     #while (True):
@@ -0,0 +1,218 @@
+# sinks.py
+
+import gzip
+import importlib.util
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+# --output-format choices
+FORMATS = ['json', 'jsonl', 'parquet', 'sqlite']
+
+# --shard-by choices
+SHARDS = ['year', 'issue']
+
+
+def open_sink(output_format, directory, shard_by=None, compress=False):
+    '''Return the Sink that writes output_format into directory.'''
+    sink_classes = {'json': JsonSink,
+                    'jsonl': JsonlSink,
+                    'parquet': ParquetSink,
+                    'sqlite': SqliteSink}
+    return sink_classes[output_format](directory, shard_by, compress)
+
+
+def shard(pub_info, shard_by):
+    '''Return the subdirectory an issue is written to: the year (the first
+       part of its XXXX-XX-XXX publication info), the issue itself, or ''.'''
+    if shard_by == 'year':
+        return (pub_info or 'unknown').split('-')[0]
+    if shard_by == 'issue':
+        return pub_info or 'unknown'
+    return ''
+
+
+class Sink(object):
+    '''Writes the reconstructed articles of one issue at a time. write()
+       returns the files the issue was written to, so they can be recorded in
+       a Manifest. Each sink writes an issue in write_issue().'''
+
+    def __init__(self, directory, shard_by=None, compress=False):
+        self.directory = directory
+        self.shard_by = shard_by
+        self.compress = compress
+
+    def config(self):
+        '''Describe the output, so a Manifest can tell when it changes.'''
+        return '{} dir={} shard={} compress={}'.format(
+            type(self).__name__, os.path.abspath(self.directory),
+            self.shard_by, self.compress)
+
+    def issue_dir(self, pub_info):
+        '''Return the (created) directory an issue's output goes in.'''
+        directory = os.path.join(self.directory, shard(pub_info,
+                                                       self.shard_by))
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def write(self, pub_info, articles):
+        '''Write an issue's articles. Issues without publication info, whose
+           file names have no XXXX-XX-XXX, have nothing to name or replace
+           their output by and are skipped.'''
+        if pub_info is None:
+            return []
+        return self.write_issue(pub_info, articles)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JsonSink(Sink):
+    '''One indented JSON file per article, named PUBINFO_ARTICLENUM.json
+       (.json.gz if compressed).'''
+
+    def write_issue(self, pub_info, articles):
+        directory = self.issue_dir(pub_info)
+        extension = '.json.gz' if self.compress else '.json'
+
+        file_names = []
+        for article in articles:
+            file_name = os.path.join(directory, '{}_{}{}'.format(
+                pub_info, article['article_number'], extension))
+            text = json.dumps(article, indent=4, ensure_ascii=False)
+            write_text(file_name, text, self.compress)
+            file_names.append(file_name)
+
+        return file_names
+
+
+class JsonlSink(Sink):
+    '''One file per issue, PUBINFO.jsonl (.jsonl.gz if compressed), with one
+       article per line.'''
+
+    def write_issue(self, pub_info, articles):
+        extension = '.jsonl.gz' if self.compress else '.jsonl'
+        file_name = os.path.join(self.issue_dir(pub_info),
+                                 pub_info + extension)
+        text = ''.join(json.dumps(article, ensure_ascii=False) + '\n'
+                       for article in articles)
+        write_text(file_name, text, self.compress)
+        return [file_name]
+
+
+class ParquetSink(Sink):
+    '''A Parquet dataset with one part file per issue, PUBINFO.parquet, so
+       reprocessing an issue replaces only its own rows. Compressed with gzip
+       if compressed, otherwise with the engine's default (snappy).'''
+
+    def __init__(self, directory, shard_by=None, compress=False):
+        super().__init__(directory, shard_by, compress)
+        if not (importlib.util.find_spec('pyarrow') or
+                importlib.util.find_spec('fastparquet')):
+            raise ImportError('--output-format parquet requires pyarrow or '
+                              'fastparquet')
+
+    def write_issue(self, pub_info, articles):
+        file_name = os.path.join(self.issue_dir(pub_info),
+                                 pub_info + '.parquet')
+        tmp_file_name = '{}.{}.tmp'.format(file_name, os.getpid())
+        df = pd.DataFrame(articles)
+        df.to_parquet(tmp_file_name, index=False,
+                      compression='gzip' if self.compress else 'snappy')
+        os.replace(tmp_file_name, file_name)
+        return [file_name]
+
+
+class SqliteSink(Sink):
+    '''An articles table in articles.sqlite. Lists and dicts are stored as
+       JSON. Each issue's articles replace any it had before, in a single
+       transaction. compress is ignored.'''
+
+    FILE_NAME = 'articles.sqlite'
+    TABLE = 'articles'
+
+    def __init__(self, directory, shard_by=None, compress=False):
+        super().__init__(directory, shard_by, compress)
+        # open connection and its table columns per database file
+        self.connections = {}
+
+    def write_issue(self, pub_info, articles):
+        file_name = os.path.join(self.issue_dir(pub_info), self.FILE_NAME)
+        (connection, columns) = self.connect(file_name, articles)
+        if columns is None:
+            # no table yet and nothing to put in it
+            return []
+
+        rows = [[to_sql_value(article.get(col)) for col in columns]
+                for article in articles]
+        with connection:
+            connection.execute('DELETE FROM {} WHERE publication = ?'
+                               .format(self.TABLE), (pub_info,))
+            connection.executemany('INSERT INTO {} ({}) VALUES ({})'.format(
+                self.TABLE, ', '.join('"{}"'.format(col) for col in columns),
+                ', '.join('?' for _ in columns)), rows)
+
+        return [file_name]
+
+    def connect(self, file_name, articles):
+        '''Return [connection, columns] for file_name, creating the table
+           with the columns of the first article written if needed. columns
+           is None while the table does not exist.'''
+        if file_name not in self.connections:
+            self.connections[file_name] = [sqlite3.connect(file_name), None]
+        entry = self.connections[file_name]
+
+        if entry[1] is None:
+            connection = entry[0]
+            columns = [row[1] for row in connection.execute(
+                'PRAGMA table_info({})'.format(self.TABLE))]
+            if not columns and articles:
+                columns = list(articles[0])
+                with connection:
+                    connection.execute(
+                        'CREATE TABLE {} ({})'.format(
+                            self.TABLE,
+                            ', '.join('"{}"'.format(col) for col in columns)))
+                    connection.execute(
+                        'CREATE INDEX {0}_publication ON {0} (publication)'
+                        .format(self.TABLE))
+            entry[1] = columns or None
+
+        return entry
+
+    def close(self):
+        for (connection, _) in self.connections.values():
+            connection.close()
+        self.connections = {}
+
+
+def to_sql_value(value):
+    '''Store lists and dicts as JSON, NaN as NULL and numpy scalars as
+       Python values.'''
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if hasattr(value, 'item'):
+        # numpy scalar
+        value = value.item()
+    if value is not None and value != value:
+        # NaN
+        return None
+    return value
+
+
+def write_text(file_name, text, compress=False):
+    '''Write text to file_name, gzipped if compress.'''
+    if compress:
+        with gzip.open(file_name, 'wt', encoding='utf-8') as file_out:
+            file_out.write(text)
+    else:
+        with open(file_name, 'w') as file_out:
+            file_out.write(text)
@@ -0,0 +1,99 @@
+# stagecache.py
+
+import glob
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+
+from manifest import file_hash
+import tagger.lexicon as lexicon
+
+# files, relative to this directory, that every tagger stage depends on
+COMMON_FILES = ['tagger/basetagger.py',
+                'tagger/lexicon.py',
+                'tagger/linefeatures.py',
+                'tagger/nbtables.py',
+                'tagger/pos.py',
+                'tagger/schema.py']
+
+# files, relative to this directory, that only one tagger stage depends on
+STAGE_FILES = {'pub': ['tagger/pubtagger.py'],
+               'bl': ['tagger/bltagger.py'],
+               'hl': ['tagger/hltagger.py'],
+               'junk': ['tagger/junktagger.py',
+                        'tagger/classifiers/junktagger_*.pickle'],
+               'txt': ['tagger/txttagger.py',
+                       'tagger/classifiers/txttagger_*.pickle'],
+               'jump': ['tagger/jumptagger.py'],
+               'articlenum': ['tagger/articlenumtagger.py']}
+
+
+def hash_files(patterns, root):
+    '''Return a single hash of the contents of every file matching
+       patterns.'''
+    digest = hashlib.sha1()
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            digest.update('{} {}\n'.format(os.path.relpath(path, root),
+                                           file_hash(path)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def hash_df(df):
+    '''Return a hash of a DataFrame's index, columns and values.'''
+    digest = hashlib.sha1()
+    digest.update(repr(list(df.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+class StageCache(object):
+    '''On-disk cache of the tags_df each tagger stage produces. The key of a
+       stage's output chains the hash of the untagged issue with the version
+       of that stage and of every stage before it, so changing a tagger only
+       invalidates its own output and the output of the stages after it.'''
+
+    def __init__(self, directory, stages, root=None):
+        root = root or os.path.dirname(os.path.abspath(__file__))
+        self.directory = directory
+        self.stages = list(stages)
+
+        common = hash_files(COMMON_FILES, root)
+        # the lexicons also change with nltk, pyenchant and the nltk data
+        common += lexicon.version()
+        self.versions = [common + hash_files(STAGE_FILES[stage], root)
+                         for stage in self.stages]
+
+        os.makedirs(directory, exist_ok=True)
+
+    def keys(self, issue_obj):
+        '''Return the key of each stage's output for an untagged issue.'''
+        keys = []
+        key = hash_df(issue_obj.tags_df)
+        for (stage, version) in zip(self.stages, self.versions):
+            key = hashlib.sha1('{} {} {}'.format(key, stage, version)
+                               .encode('utf-8')).hexdigest()
+            keys.append(key)
+        return keys
+
+    def path(self, stage, key):
+        return os.path.join(self.directory, '{}_{}.pickle'.format(stage, key))
+
+    def load(self, stage, key):
+        '''Return the cached tags_df for key, or None.'''
+        try:
+            with open(self.path(stage, key), 'rb') as file_in:
+                return pickle.load(file_in)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save(self, stage, key, tags_df):
+        '''Cache tags_df, replacing the file only once it is complete so
+           concurrent workers never read a partial file.'''
+        path = self.path(stage, key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as file_out:
+            pickle.dump(tags_df, file_out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
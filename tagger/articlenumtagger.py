@@ -2,17 +2,16 @@
 # Brandon Livitski
 
 from tagger.basetagger import *
-import sklearn
-from sklearn import metrics
 
 
-def tag(issue):
+def tag(issue, inplace=False):
     """
     Assigns article numbers and paragraph numbers to all TXT
     """
     assert check_tags_exist(issue, ["PI", "BL", "HL", "N", "B", "AT", "TXT"])
 
-    issue = copy.deepcopy(issue)
+    if not inplace:
+        issue = issue.copy()
 
     # divides the issue into pages based off page number, additionally counts number of articles
     pages = []
@@ -20,8 +19,10 @@ def tag(issue):
     current_page = []
     num_articles = 0
     on_HL = False
+    # untagged pages are NaN, which compares unequal to every page
+    page_nums = issue.tags_df["page"].astype("float64")
     for i, row in issue.tags_df.iterrows():
-        if issue.tags_df.loc[i, "page"] == 0:
+        if page_nums[i] == 0:
             continue
 
         if issue.tags_df.loc[i, "function"] == "HL":
@@ -34,7 +35,7 @@ def tag(issue):
             on_HL = True
         else:
             on_HL = False
-        if issue.tags_df.loc[i, "page"] != current_page_num:
+        if page_nums[i] != current_page_num:
             if current_page_num > 0:
                 pages.append(current_page)
             current_page = []
@@ -145,8 +146,9 @@ def main():
     txt_completeness_sum = 0
     txt_v_score_sum = 0
     for i in range(len(issues)):
-        h1, c1, v1 = article_numbering_scores(tag(untagged_issues[i]).tags_df, issues[i].tags_df, "HL")
-        h2, c2, v2 = article_numbering_scores(tag(untagged_issues[i]).tags_df, issues[i].tags_df, "TXT")
+        tagged = tag(untagged_issues[i]).tags_df
+        h1, c1, v1 = article_numbering_scores(tagged, issues[i].tags_df, "HL")
+        h2, c2, v2 = article_numbering_scores(tagged, issues[i].tags_df, "TXT")
         hl_completeness_sum = hl_completeness_sum + c1
         hl_homogeneity_sum = hl_homogeneity_sum + h1
         hl_v_score_sum = hl_v_score_sum + v1
@@ -166,6 +168,8 @@ def main():
 
 
 def article_numbering_scores(tagged, truth, function):
+    from sklearn import metrics
+
     predicted_articles = []
     for i, row in tagged.iterrows():
         if tagged.loc[i, "function"] == function:
@@ -1,7 +1,7 @@
 # basetagger.py
 
 import copy
-import glob
+import functools
 import math
 import os
 import pickle
@@ -11,15 +11,24 @@ import regex
 import re
 import sys
 
-import nltk
 import numpy as np
 import pandas as pd
 
+from tagger.linefeatures import LineFeatures
+import tagger.nbtables as nbtables
+import tagger.pos as pos
+import tagger.schema as schema
+
 
 # TODO(ngarg): CHANGE 'NA' to 'N' becuase pandas processes 'NA' as np.nan
 
 _DEFAULT_CLASSIFIER_PATH = "tagger/classifiers"
 
+# Classifiers unpickled by this process, keyed by full filename, and their
+# compiled tables, keyed by table filename. Each value is ((mtime, size) of the
+# pickle, classifier) so entries are reloaded when the pickle changes.
+_CLASSIFIERS = {}
+
 
 # ===========================================
 # ========= ISSUE CLASS & FUNCTIONS =========
@@ -49,6 +58,16 @@ class Issue(object):
         self.date = None
         self.edition = None
         self.tess_words = None
+        self._line_features = None
+
+        # Per-stage timings recorded while tagging with --profile.
+        self.timings = []
+
+    def __getstate__(self):
+        # Line features are rebuilt on demand rather than pickled.
+        state = self.__dict__.copy()
+        state["_line_features"] = None
+        return state
 
     def __str__(self):
         return '%s, %s' %(str(self.date), str(self.edition))
@@ -56,21 +75,47 @@ class Issue(object):
     @staticmethod
     def generate_tags_df(csv_file):
         # Generates a DataFrame from the csv_file provided.
-        return pd.read_csv(csv_file, header=1, names=Issue.COLUMNS)
-
-    def apply(self, col, label_func):
-        # Applies function to column col.
-        self.tags_df[col] = self.tags_df.apply(lambda row: label_func(row), axis=1)
-
-    def apply_classifier(self, col, filename, features_func, label_func):
-        # Applies classifier to column col.
-        full_filename = os.path.join(os.path.abspath(_DEFAULT_CLASSIFIER_PATH), filename)
-        pickle_file = open(full_filename, "rb")
-        classifier = pickle.load(pickle_file)
-
-        # Applies classifier.
-        self.tags_df[col] = self.tags_df.apply(
-            lambda row: label_func(row, classifier, features_func), axis=1)
+        return schema.apply(pd.read_csv(csv_file, header=1, names=Issue.COLUMNS))
+
+    def label(self, label_func, col="function"):
+        # Labels the rows whose col is still null. label_func is given those
+        # rows as a DataFrame and returns an array with one label per row;
+        # rows labeled null are left untagged.
+        untagged = self.tags_df[col].isnull()
+        if not untagged.any():
+            return
+        rows = self.tags_df.loc[untagged]
+        labels = pd.Series(np.asarray(label_func(rows), dtype=object),
+                           index=rows.index)
+        labels = labels[labels.notnull()]
+        self.tags_df.loc[labels.index, col] = labels
+
+    def label_with_classifier(self, filename, features_func, label_func, col="function"):
+        # Labels the rows whose col is still null using a classifier.
+        # label_func is called as label_func(rows, classify), where
+        # classify(rows) classifies any subset of the rows it was given.
+        classifier = load_classifier_table(filename)
+        lines = self.get_line_features()
+        classify = lambda rows: classify_lines(lines.loc[rows.index], classifier,
+                                               features_func)
+        self.label(lambda rows: label_func(rows, classify), col)
+
+    def get_line_features(self):
+        # Returns a Series with the LineFeatures of each row's text (None if
+        # the row has no text). Built once and shared by all taggers.
+        if (self._line_features is None or
+            not self._line_features.index.equals(self.tags_df.index)):
+            self._line_features = self.tags_df.text.map(
+                lambda text: None if pd.isnull(text) else LineFeatures(text))
+        return self._line_features
+
+    def copy(self):
+        # Returns a copy of the issue with its own tags_df. Cheaper than
+        # copy.deepcopy, which also recurses through every other attribute.
+        issue = copy.copy(self)
+        issue.tags_df = self.tags_df.copy()
+        issue.timings = list(self.timings)
+        return issue
 
     def print_rows(self, rows):
         # Prints the rows with the given index of the DataFrame.
@@ -103,7 +148,8 @@ def check_tags_exist(issue, tags):
 def get_issues(folder='tagged_data', columns=None, tags=None):
     """
     Gets all the Issue objects from the folder. Returns original issues and
-    untagged issues with certain columns and tags set to np.nan.
+    untagged issues with certain columns and tags set to np.nan. Each file is
+    only read, through the tagger.groundtruth cache, once its issue is used.
     Owner: Nupur Garg
 
     folder: str
@@ -115,54 +161,128 @@ def get_issues(folder='tagged_data', columns=None, tags=None):
 
     returns: (list, list)
     """
-    files = []
-    issues = []
-    untagged_issues = []
-
-    # Get test files in the folder.
-    foldername = os.path.abspath(folder)
-    for filename in os.listdir(foldername):
-        full_filename = os.path.join(foldername, filename)
-        if os.path.isfile(full_filename) and "csv" in filename:
-            files.append(full_filename)
-
-    # Create issue objects from the test files.
-    for csv_file in files:
-        issue = Issue(Issue.generate_tags_df(csv_file),
-                      os.path.basename(os.path.normpath(csv_file)))
-
-        # TODO(ngarg): Consider another approach to replace these columns.
-        # Edit the default values within the issue.
-        issue.tags_df.function.replace(np.nan, "N", inplace=True)
-        issue.tags_df.function = issue.tags_df.function.str.strip()
-        issue.tags_df.jump = issue.tags_df.jump.astype(str)
-        issue.tags_df.jump.replace("0.0", "0", inplace=True)
-        issue.tags_df.jump.replace("nan", "0", inplace=True)
-
-        issues.append(issue)
-        issue = copy.deepcopy(issue)
-
-        # Sets columns to None.
-        if columns:
-            for col in columns:
-                issue.tags_df[col] = np.nan
-
-        # Removes function tags.
-        if tags:
-            unique_tags = issue.tags_df.function.unique()
-            remove_tags = set(unique_tags) - set(tags)
-            for tag in remove_tags:
-                issue.tags_df.function.replace(tag, np.nan, inplace=True)
-        untagged_issues.append(issue)
+    import tagger.groundtruth as groundtruth
 
+    issues = groundtruth.get_tagged_issues(folder, _fill_function)
+    untagged_issues = groundtruth.get_tagged_issues(
+        folder, functools.partial(_untag, columns, tags))
     return issues, untagged_issues
 
 
+def _fill_function(tags_df):
+    # Edit the default values within the issue. Tags were stripped and jumps
+    # coded by schema.apply().
+    tags_df["function"] = tags_df.function.fillna("N")
+    return tags_df
+
+
+def _untag(columns, tags, tags_df):
+    tags_df = _fill_function(tags_df)
+
+    # Sets columns to None.
+    if columns:
+        schema.reset(tags_df, columns)
+
+    # Removes function tags.
+    if tags:
+        tags_df["function"] = tags_df.function.where(tags_df.function.isin(tags))
+    return tags_df
+
+
 # ========================================
 # ========= CLASSIFIER FUNCTIONS =========
 # ========================================
 
 
+def load_classifier(filename, path=_DEFAULT_CLASSIFIER_PATH):
+    """
+    Gets a pickled classifier. Each file is only unpickled once per process,
+    and again if it has changed on disk since it was loaded.
+
+    filename: str
+        Name of pickle file.
+    path: str
+        Path to pickle file.
+
+    returns: obj
+    """
+    full_filename = os.path.join(os.path.abspath(path), filename)
+    version = _file_version(full_filename)
+
+    cached = _CLASSIFIERS.get(full_filename)
+    if cached is None or cached[0] != version:
+        with open(full_filename, "rb") as pickle_file:
+            cached = (version, pickle.load(pickle_file))
+        _CLASSIFIERS[full_filename] = cached
+    return cached[1]
+
+
+def load_classifier_table(filename, path=_DEFAULT_CLASSIFIER_PATH):
+    """
+    Gets a pickled classifier ready for classifying many lines at once. Naive
+    Bayes classifiers come back as a NaiveBayesTable, read from the .npz
+    exported next to the pickle if it was exported from this pickle, and
+    compiled from the pickle otherwise. Other classifiers are returned as is.
+
+    filename: str
+        Name of pickle file.
+    path: str
+        Path to pickle file.
+
+    returns: obj
+    """
+    full_filename = os.path.join(os.path.abspath(path), filename)
+    table_filename = nbtables.table_filename(full_filename)
+    version = _file_version(full_filename)
+
+    cached = _CLASSIFIERS.get(table_filename)
+    if cached is None or cached[0] != version:
+        table = None
+        if os.path.exists(table_filename):
+            table = nbtables.NaiveBayesTable.load(
+                table_filename, lambda: load_classifier(filename, path),
+                source=nbtables.file_digest(full_filename))
+        if table is None:
+            import nltk
+
+            table = load_classifier(filename, path)
+            if isinstance(table, nltk.NaiveBayesClassifier):
+                table = nbtables.NaiveBayesTable.from_classifier(table)
+        cached = (version, table)
+        _CLASSIFIERS[table_filename] = cached
+    return cached[1]
+
+
+def _file_version(filename):
+    # Changes whenever the file is rewritten.
+    stat = os.stat(filename)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def preload_classifiers(path=_DEFAULT_CLASSIFIER_PATH):
+    """
+    Loads every pickled classifier in path. Calling this before starting
+    worker processes lets forked workers share the loaded classifiers instead
+    of each unpickling their own.
+
+    path: str
+        Path to pickle files.
+
+    returns: None
+    """
+    for filename in sorted(os.listdir(os.path.abspath(path))):
+        if filename.endswith(".pickle"):
+            load_classifier_table(filename, path)
+
+
+_PAGE_JUMP_PATTERN = regex.compile("(((See \w{1,10}, \w{1,10} page)|"
+                                   "(See \w{1,10}, page \d{1,2})|"
+                                   "(See page \d{1,2})|"
+                                   "(From page)){e<=4})|"
+                                   "(page \d{1,2}){e<=1}",
+                                   flags=regex.ENHANCEMATCH)
+
+
 def has_page_jump(text):
     """
     Determines if the text has a page jump.
@@ -172,16 +292,27 @@ def has_page_jump(text):
 
     returns: bool
     """
-    fmt_str = ("(((See \w{1,10}, \w{1,10} page)|"
-               "(See \w{1,10}, page \d{1,2})|"
-               "(See page \d{1,2})|"
-               "(From page)){e<=4})|"
-               "(page \d{1,2}){e<=1}")
-    pattern = regex.compile(fmt_str, flags=regex.ENHANCEMATCH)
-    match = regex.search(pattern, text, concurrent=True)
+    match = regex.search(_PAGE_JUMP_PATTERN, text, concurrent=True)
     return bool(match)
 
 
+def classify_lines(lines, classifier, features_func):
+    """
+    Classifies every line.
+
+    lines: list
+        LineFeatures of the lines to classify.
+    classifier: obj
+        Classifier.
+    features_func: func
+        Function that generates the features for a LineFeatures.
+
+    returns: np.array
+    """
+    featuresets = [features_func(line) for line in lines]
+    return np.array(classifier.classify_many(featuresets), dtype=bool)
+
+
 # TODO(ngarg): Confirm this calculates precision and recall correctly.
 def print_accuracy_tag(orig_issues, tagged_issues, tag, jump_col=False, print_incorrect=False):
     """
@@ -211,8 +342,8 @@ def print_accuracy_tag(orig_issues, tagged_issues, tag, jump_col=False, print_in
     print("=================================")
     for orig_issue, tagged_issue in zip(orig_issues, tagged_issues):
         if jump_col:
-            expected_tags = orig_issue.tags_df[orig_issue.tags_df.jump != '0']
-            actual_tags = tagged_issue.tags_df[tagged_issue.tags_df.jump != '0']
+            expected_tags = orig_issue.tags_df[orig_issue.tags_df.jump != schema.JUMP_NONE]
+            actual_tags = tagged_issue.tags_df[tagged_issue.tags_df.jump != schema.JUMP_NONE]
         else:
             expected_tags = orig_issue.tags_df[orig_issue.tags_df.function == tag]
             actual_tags = tagged_issue.tags_df[tagged_issue.tags_df.function == tag]
@@ -303,6 +434,8 @@ def _print_statistics(classifier, test, score, stats, debug):
 
     returns: None
     """
+    import nltk
+
     if debug:
         print('__Result__\t\t__Actual__')
         for features, actual in test:
@@ -331,8 +464,13 @@ def create_naive_bayes_classifier(training, test, stats=True, debug=False):
 
     returns: (obj, int)
     """
+    import nltk
+
     classifier = nltk.NaiveBayesClassifier.train(training)
-    score = nltk.classify.accuracy(classifier, test)
+    # The compiled table classifies the test data as the classifier would, in
+    # one matrix product.
+    table = nbtables.NaiveBayesTable.from_classifier(classifier)
+    score = nltk.classify.accuracy(table, test)
 
     _print_statistics(classifier, test, score, stats, debug)
     return classifier, score
@@ -364,37 +502,99 @@ def create_classifier(issues, classifier_func, features_func, tags,
 
     returns: None
     """
-    tagged_data = []
-    other_data = []
-    features = []
+    create_classifiers([(issues, filename, features_func, tags)],
+                       classifier_func=classifier_func, path=path,
+                       stats=stats, debug=debug)
 
-    # Split data into tagged with tags and other tags.
-    for issue in issues:
-        matches = issue.tags_df.function.isin(tags)
-        tagged_data.extend(issue.tags_df.loc[matches].values)
-        other_data.extend(issue.tags_df.loc[np.logical_not(matches)].values)
-
-    # Generate tagged and other features.
-    tagged_df = pd.DataFrame(tagged_data, columns=Issue.COLUMNS)
-    other_df = pd.DataFrame(other_data, columns=Issue.COLUMNS)
-    for index, row in tagged_df.iterrows():
-        if not pd.isnull(row.text) and row.text.strip():
-            features.append((features_func(row), True))
-    for index, row in other_df.iterrows():
-        if not pd.isnull(row.text) and row.text.strip():
-            features.append((features_func(row), False))
-
-    # Generate classifier.
-    training, test = split_training_test(features)
-    classifier, score = classifier_func(training, test, stats=stats, debug=debug)
-
-    # Stores classifier.
-    full_filename = os.path.join(os.path.abspath(path), filename)
-    pfile = open(full_filename, "wb")
-    pickle.dump(classifier, pfile)
 
+def create_classifiers(training_sets, classifier_func=create_naive_bayes_classifier,
+                       path=_DEFAULT_CLASSIFIER_PATH, jobs=1, stats=True,
+                       debug=False, cache=True):
+    """
+    Creates several classifiers, as create_classifier() does, and stores each
+    in its filename. The features of each line are computed once for all
+    classifiers and kept in the feature store, and with jobs > 1 the features
+    are computed and the classifiers trained in parallel.
+
+    training_sets: list
+        (issues, filename, features_func, tags) of each classifier.
+    classifier_func: func
+        Function that generates the classifiers.
+    path: str
+        Path to pickle files.
+    jobs: int
+        Number of worker processes (default: 1).
+    stats: bool
+        Whether to print summary statistics (default: True).
+    debug: bool
+        Whether to debug (default: False).
+    cache: bool
+        Whether to reuse and keep features in the feature store (default:
+        True).
 
-def tag_junk(issue, replace_nan=False, replace_all=True):
+    returns: None
+    """
+    import multiprocessing
+
+    import nltk
+    import tagger.featurestore as featurestore
+
+    # Gets the features of each issue once, for all the classifiers using it.
+    issues = list({id(issue): issue for (training_issues, _, _, _) in training_sets
+                   for issue in training_issues}.values())
+    features_funcs = [features_func for (_, _, features_func, _) in training_sets]
+    issue_features = dict(zip(map(id, issues), featurestore.get_features(
+        issues, features_funcs, jobs=jobs,
+        cache_dir=featurestore._CACHE_DIR if cache else None)))
+
+    # Splits data into tagged with tags and other tags.
+    data = []
+    for (training_issues, _, features_func, tags) in training_sets:
+        tagged_data = []
+        other_data = []
+        for issue in training_issues:
+            usable = featurestore.usable_rows(issue.tags_df)
+            matches = issue.tags_df.function[usable].isin(tags).tolist()
+            for (features, match) in zip(issue_features[id(issue)][features_func],
+                                         matches):
+                (tagged_data if match else other_data).append(features)
+        labeled = ([(features, True) for features in tagged_data] +
+                   [(features, False) for features in other_data])
+        data.append(split_training_test(labeled))
+
+    # Generates classifiers.
+    if jobs > 1 and len(data) > 1:
+        with multiprocessing.Pool(processes=min(jobs, len(data))) as pool:
+            results = pool.starmap(_train_classifier,
+                                   [(classifier_func, training, test)
+                                    for (training, test) in data])
+    else:
+        results = [_train_classifier(classifier_func, training, test)
+                   for (training, test) in data]
+
+    # Stores classifiers.
+    for ((_, filename, _, _), (_, test), (classifier, score)) in zip(
+            training_sets, data, results):
+        if len(training_sets) > 1 and (stats or debug):
+            print(filename)
+        _print_statistics(classifier, test, score, stats, debug)
+
+        full_filename = os.path.join(os.path.abspath(path), filename)
+        with open(full_filename, "wb") as pfile:
+            pickle.dump(classifier, pfile)
+        _CLASSIFIERS.pop(full_filename, None)
+        _CLASSIFIERS.pop(nbtables.table_filename(full_filename), None)
+        if isinstance(classifier, nltk.NaiveBayesClassifier):
+            nbtables.export(full_filename, classifier)
+
+
+def _train_classifier(classifier_func, training, test):
+    # Runs in a worker process when creating classifiers with jobs > 1.
+    # Statistics are printed by the caller, in order.
+    return classifier_func(training, test, stats=False, debug=False)
+
+
+def tag_junk(issue, replace_nan=False, replace_all=True, inplace=False):
     """
     Tags any untagged rows in 'function' column as junk (JNK).
 
@@ -404,18 +604,23 @@ def tag_junk(issue, replace_nan=False, replace_all=True):
         Whether to replace np.nan with JNK (default=False).
     replace_all: bool
         Whether to replace the tag on other junk coumns with JNK (default=True).
+    inplace: bool
+        Whether to modify issue instead of a copy of it (default=False).
 
     returns: obj
     """
-    issue = copy.deepcopy(issue)
+    if not inplace:
+        issue = issue.copy()
     tags = []
-    if replace_nan:
-        tags.append(np.nan)
     if replace_all:
         tags.extend(["B", "AT", "N", "CT", "CN", "OT", "PH", "MH", "BQA", "BQN", "BQT", "NP", "SH"])
 
-    for tag in tags:
-        issue.tags_df.function.replace(tag, "JNK", inplace=True)
+    # Assigns the column back; replacing inplace through issue.tags_df.function
+    # may only change a copy of it.
+    junk = issue.tags_df.function.isin(tags)
+    if replace_nan:
+        junk |= issue.tags_df.function.isnull()
+    issue.tags_df["function"] = issue.tags_df.function.where(~junk, "JNK")
     return issue
 
 
@@ -480,21 +685,19 @@ def compute_jump_metric(original_issues, tagged_issues):
 
 
 def get_pos_by_tag(tag):
-    paths = glob.glob("tagged_data/*.csv")
-    columns = ["page", "article", "function", "paragraph", "jump", "ad", "text"]
-    tagged_sents = []
-    for path in paths:
-        issue = pd.read_csv(path, header = 2, names = columns)
-        issue = issue.dropna(how = "all")
-        for _, row in issue.iterrows():
-            if row.function == tag and pd.notnull(row.text):
-                tokens = nltk.word_tokenize(row.text)
-                if len(tokens) < 10:
-                    tokens = nltk.word_tokenize(row.text)
-                    pos_tags = nltk.pos_tag(tokens)
-                    tagged_sents.append([pos for _, pos in pos_tags
-                                             if pos != ")"])
-    return tagged_sents
+    import nltk
+    import tagger.groundtruth as groundtruth
+
+    sents = []
+    for issue in groundtruth.get_tagged_issues():
+        tags_df = issue.tags_df
+        rows = tags_df[(tags_df.function == tag) & tags_df.text.notnull()]
+        for text in rows.text:
+            tokens = nltk.word_tokenize(text)
+            if len(tokens) < 10:
+                sents.append(tokens)
+    return [[pos_tag for pos_tag in pos_tags if pos_tag != ")"]
+            for pos_tags in pos.tag_sents(sents)]
 
 
 def create_tag_pattern(tag):
@@ -514,6 +717,8 @@ def find_unique_pos_tags(this_tag, other_tag):
 
 
 def print_pos_freq_dist(tagged_sents, limit = 20):
+    import nltk
+
     fd = nltk.FreqDist(tuple(tagged_sent) for tagged_sent in tagged_sents)
     pprint.pprint(dict(fd.most_common(limit)))
 
@@ -538,23 +743,21 @@ def get_progress(stop):
 
 
 def measure_precision_recall(tag_str, tag_fun, limit = sys.maxsize):
+    import tagger.groundtruth as groundtruth
+
     pd.set_option("display.width", None)
     pd.set_option("display.max_rows", None)
     pd.set_option("display.max_colwidth", 100)
-    paths = glob.glob("tagged_data/*.csv")
-    columns = ["page", "article", "function", "paragraph", "jump", "ad", "text"]
+    issues = groundtruth.get_tagged_issues(prepare=groundtruth.drop_blank)[:limit]
     content_tags = ["HL", "BL", "TXT"]
     if tag_str in content_tags:
         content_tags.remove(tag_str)
     tps = []
     fps = []
     fns = []
-    message = get_progress(len(paths[:limit]))
-    for path in paths[:limit]:
+    message = get_progress(len(issues))
+    for issue in issues:
         next(message)
-        tags_df = pd.read_csv(path, header = 2, names = columns)
-        tags_df = tags_df.dropna(how = "all")
-        issue = Issue(tags_df)
         actual = issue.tags_df.function.rename("actual")
         issue = tag_fun(issue, test = True)
         issue.tags_df = issue.tags_df.join(actual)
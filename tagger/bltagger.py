@@ -1,11 +1,8 @@
 # bltagger.py
 # Daniel Kauffman
 
-import copy
 import regex
-import string
 
-import nltk
 import numpy as np
 import pandas as pd
 
@@ -16,36 +13,31 @@ def main():
     basetagger.measure_precision_recall("BL", tag, limit = 30)
 
 
-def tag(issue, test = False):
-    issue = copy.deepcopy(issue)
+def tag(issue, test = False, inplace = False):
+    if not inplace:
+        issue = issue.copy()
     if test:
         all_tags = "|".join(t for t in issue.tags_df.function.unique()
                               if pd.notnull(t) and t != "PI")
         pattern = r"^(?:{0})$".format(all_tags)
-        issue.tags_df.function = issue.tags_df.function.replace(pattern, np.NaN,
+        issue.tags_df.function = issue.tags_df.function.replace(pattern, np.nan,
                                                                 regex = True)
-    matched = pd.concat([find_byline(issue.tags_df),
-                         find_description(issue.tags_df)])
+    lines = issue.get_line_features()
+    matched = pd.concat([find_byline(issue.tags_df, lines),
+                         find_description(issue.tags_df, lines)])
     if len(matched) > 0:
         matched = matched.drop_duplicates().sort_index()
         for i, row in matched.iterrows():
             if pd.isnull(issue.tags_df.loc[i].function):
-                issue.tags_df.set_value(i, "function", "BL")
+                issue.tags_df.at[i, "function"] = "BL"
     return issue
 
 
-def remove_punctuation(text):
-    replaced = regex.sub("[^{0}]".format("\s:"), "", text)
-    replaced = regex.sub("[^{0}]".format(string.ascii_letters + string.digits),
-                         " ", text)
-    return replaced.upper()
-
-
 def e(error):
     return "{{" + "s<={0},i<=1,d<=1,e<={0}".format(error) + "}}"
 
 
-def find_byline(issue, error = 3):
+def find_byline(issue, lines, error = 3):
     adjs = "|".join(["ASSOCIATED", "STAFF", "EDITORIAL", "MANAGING",
                      "CONTRIBUTING", "COMMENTARY", "SPORTS", "OUTDOOR"])
     nouns = "|".join(["PRESS", "STAFF", "EDITOR", "WRITER", "REPORT",
@@ -62,17 +54,16 @@ def find_byline(issue, error = 3):
                 "$").format(adjs, nouns)
     pattern = regex.compile(fmt_str, flags = regex.ENHANCEMATCH)
     matched = []
-    for _, row in issue.iterrows():
+    for i, row in issue.iterrows():
         if pd.notnull(row.text) and len(row.text) < 100 and ":" not in row.text:
-            text = remove_punctuation(row.text)
-            match = regex.match(pattern, text, concurrent = True)
-            tokens = nltk.word_tokenize(text)
-            if len(tokens) > 1 and match:
+            match = regex.match(pattern, lines.at[i].alnum_upper,
+                                concurrent = True)
+            if match and len(lines.at[i].alnum_upper_tokens) > 1:
                 matched.append(row)
     return pd.DataFrame(matched)
 
 
-def find_description(issue):
+def find_description(issue, lines):
     nouns = "|".join(["FRESHMAN", "SOPHOMORE", "JUNIOR", "SENIOR", "MAJOR",
                       "PROFESSOR"])
     fmt_str = (r"^(?:[A-Z]+\s*){{2,3}}" +   # name
@@ -84,12 +75,11 @@ def find_description(issue):
                 "$").format(nouns)
     pattern = regex.compile(fmt_str, flags = regex.ENHANCEMATCH)
     matched = []
-    for _, row in issue.iterrows():
+    for i, row in issue.iterrows():
         if pd.notnull(row.text):
-            text = remove_punctuation(row.text).strip()
+            text = lines.at[i].alnum_upper.strip()
             match = regex.match(pattern, text, concurrent = True)
-            tokens = nltk.word_tokenize(text)
-            if len(tokens) > 1 and match:
+            if match and len(lines.at[i].alnum_upper_tokens) > 1:
                 matched.append(row)
     return pd.DataFrame(matched)
 
@@ -0,0 +1,280 @@
+# evaluate.py
+
+import argparse
+import functools
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from stagecache import StageCache
+import tagger.basetagger as basetagger
+import tagger.groundtruth as groundtruth
+import tagger.schema as schema
+import tagger.pubtagger as pubtagger
+import tagger.bltagger as bltagger
+import tagger.hltagger as hltagger
+import tagger.junktagger as junktagger
+import tagger.txttagger as txttagger
+import tagger.jumptagger as jumptagger
+import tagger.articlenumtagger as articlenumtagger
+
+
+# Cached output of each tagger on each tagged issue.
+_DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "cache", "evaluate")
+
+# How each tagger is evaluated, as in its main(): (tag function, whether it
+# is called with test=True on the tagged issue, columns and function tags
+# kept for get_issues() otherwise, scores). Each score is (name, kind, tag):
+#   function - precision/recall of rows tagged tag
+#   junk     - precision/recall of JNK after basetagger.tag_junk()
+#   jump     - precision/recall of rows with a jump
+#   articles - homogeneity/completeness/v-measure of the article numbers of
+#              rows tagged tag
+_TAGGERS = {
+    "pub": (pubtagger.tag, True, None, None,
+            [("PI", "function", "PI")]),
+    "bl": (bltagger.tag, True, None, None,
+           [("BL", "function", "BL")]),
+    "hl": (hltagger.tag, True, None, None,
+           [("HL", "function", "HL")]),
+    "junk": (junktagger.tag, False,
+             ["article", "paragraph", "jump", "ad"], junktagger._TAGS_TO_KEEP,
+             [(tag, "function", tag) for tag in ["B", "N", "AT", "OT", "MH", "SH"]] +
+             [("JNK", "junk", "JNK")]),
+    "txt": (txttagger.tag, False,
+            ["article", "paragraph", "jump"], txttagger._REQUIRED_TAGS,
+            [("TXT", "function", "TXT")]),
+    "jump": (jumptagger.tag, False,
+             ["article", "paragraph", "jump"], jumptagger._REQUIRED_TAGS,
+             [("JUMP", "jump", None)]),
+    "articlenum": (articlenumtagger.tag, False,
+                   ["paragraph", "article"],
+                   ["PI", "BL", "HL", "N", "B", "TXT", "AT"],
+                   [("HL articles", "articles", "HL"),
+                    ("TXT articles", "articles", "TXT")]),
+}
+
+# Order of the taggers in the reconstructor, and of the results table.
+TAGGER_NAMES = ["pub", "bl", "hl", "junk", "txt", "jump", "articlenum"]
+
+
+def get_inputs(path, name):
+    """
+    Gets the expected and untagged versions of a tagged issue for a tagger.
+
+    path: str
+        Tagged csv file.
+    name: str
+        Tagger name.
+
+    returns: (obj, obj)
+    """
+    (_, test, columns, tags, _) = _TAGGERS[name]
+    if test:
+        truth = groundtruth.TaggedIssue(path, prepare=functools.partial(
+            _prepare, [groundtruth.drop_blank]))
+        return truth, truth.copy()
+    truth = groundtruth.TaggedIssue(path, prepare=functools.partial(
+        _prepare, [basetagger._fill_function]))
+    untagged = groundtruth.TaggedIssue(path, prepare=functools.partial(
+        _prepare, [functools.partial(basetagger._untag, columns, tags)]))
+    return truth, untagged
+
+
+def _prepare(steps, tags_df):
+    # Taggers look rows up by label, so every row needs its own.
+    tags_df = groundtruth.unique_index(tags_df)
+    for step in steps:
+        tags_df = step(tags_df)
+    return tags_df
+
+
+def run_tagger(name, issue, stage_cache=None):
+    """
+    Tags an issue with one tagger, using its cached output if the issue and
+    tagger are unchanged.
+
+    name: str
+        Tagger name.
+    issue: obj
+        Issue to tag.
+    stage_cache: obj
+        StageCache of the tagger's output, or None.
+
+    returns: obj
+    """
+    (tag_func, test, _, _, _) = _TAGGERS[name]
+    if stage_cache:
+        key = stage_cache.keys(issue)[0]
+        tags_df = stage_cache.load(name, key)
+        if tags_df is not None:
+            issue.tags_df = tags_df
+            return issue
+
+    issue = tag_func(issue, test=True) if test else tag_func(issue)
+    if stage_cache:
+        stage_cache.save(name, key, issue.tags_df)
+    return issue
+
+
+def score(kind, tag, truth_df, tagged_df):
+    """
+    Scores one tagger's output on one issue.
+
+    kind: str
+        "function", "junk", "jump" or "articles".
+    tag: str
+        Function tag scored.
+    truth_df: DataFrame
+        Expected tags.
+    tagged_df: DataFrame
+        Tags produced by the tagger.
+
+    returns: tuple
+        (true positives, expected, actual) counts, or
+        (homogeneity, completeness, v-measure) for articles.
+    """
+    if kind == "articles":
+        from sklearn import metrics
+
+        # rows without an article number are one more cluster
+        actual = truth_df.article[truth_df.function == tag].fillna(-1)
+        predicted = tagged_df.article[tagged_df.function == tag].fillna(-1)
+        return metrics.homogeneity_completeness_v_measure(
+            actual.astype(int).tolist(), predicted.astype(int).tolist())
+
+    if kind == "jump":
+        expected = truth_df.jump != schema.JUMP_NONE
+        actual = tagged_df.jump != schema.JUMP_NONE
+    else:
+        if kind == "junk":
+            truth_df = basetagger.tag_junk(basetagger.Issue(truth_df)).tags_df
+            tagged_df = basetagger.tag_junk(basetagger.Issue(tagged_df)).tags_df
+        expected = truth_df.function == tag
+        actual = tagged_df.function == tag
+    actual = actual.reindex(expected.index, fill_value=False)
+    return (int((expected & actual).sum()), int(expected.sum()),
+            int(actual.sum()))
+
+
+def evaluate_issue(path, names, stage_caches=None):
+    """
+    Runs taggers on one tagged issue and scores them. Runs in a worker
+    process when evaluating with --jobs.
+
+    path: str
+        Tagged csv file.
+    names: list
+        Tagger names.
+    stage_caches: dict
+        StageCache of each tagger, or None.
+
+    returns: dict
+        Scores of each (tagger, score name).
+    """
+    results = {}
+    for name in names:
+        (truth, untagged) = get_inputs(path, name)
+        tagged = run_tagger(name, untagged,
+                            stage_caches.get(name) if stage_caches else None)
+        for (score_name, kind, tag) in _TAGGERS[name][4]:
+            results[(name, score_name)] = score(kind, tag, truth.tags_df,
+                                                tagged.tags_df)
+    return results
+
+
+def evaluate(paths, names, jobs=1, cache_dir=_DEFAULT_CACHE_DIR):
+    """
+    Runs taggers on tagged issues, in parallel with jobs > 1, and combines
+    their scores. Counts are summed over all issues; article numbering
+    scores are averaged over issues.
+
+    paths: list
+        Tagged csv files.
+    names: list
+        Tagger names.
+    jobs: int
+        Number of worker processes.
+    cache_dir: str
+        Folder of cached tagger output, or None to always rerun the taggers.
+
+    returns: DataFrame
+    """
+    stage_caches = None
+    if cache_dir:
+        stage_caches = {name: StageCache(cache_dir, [name]) for name in names}
+    evaluate_func = functools.partial(evaluate_issue, names=names,
+                                      stage_caches=stage_caches)
+
+    if jobs > 1:
+        # load the classifiers once here so forked workers inherit them
+        basetagger.preload_classifiers()
+        with multiprocessing.Pool(processes=jobs) as pool:
+            issue_results = pool.map(evaluate_func, paths)
+    else:
+        issue_results = [evaluate_func(path) for path in paths]
+
+    rows = []
+    for name in names:
+        for (score_name, kind, _) in _TAGGERS[name][4]:
+            values = np.array([results[(name, score_name)]
+                               for results in issue_results], dtype=float)
+            row = {"tagger": name, "score": score_name}
+            if kind == "articles":
+                (row["homogeneity"], row["completeness"],
+                 row["v_measure"]) = values.mean(axis=0)
+            else:
+                (true_pos, expected, actual) = values.sum(axis=0)
+                row["precision"] = true_pos / actual if actual else np.nan
+                row["recall"] = true_pos / expected if expected else np.nan
+                row["expected"] = int(expected)
+            rows.append(row)
+
+    results = pd.DataFrame(rows, columns=["tagger", "score", "precision",
+                                          "recall", "expected", "homogeneity",
+                                          "completeness", "v_measure"])
+    results["expected"] = results["expected"].astype("Int64")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate taggers against "
+                                     "the manually tagged issues.")
+    parser.add_argument("--taggers", default=",".join(TAGGER_NAMES),
+                        help="Comma-separated taggers to evaluate "
+                        "(default: all of {0}).".format(",".join(TAGGER_NAMES)))
+    parser.add_argument("--data", default=groundtruth.DEFAULT_FOLDER,
+                        dest="folder",
+                        help="Folder of tagged csv files (default: "
+                        "tagged_data).")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only evaluate the first LIMIT issues.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: one per "
+                        "CPU).")
+    parser.add_argument("--cache-dir", default=_DEFAULT_CACHE_DIR,
+                        help="Folder of cached tagger output.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Rerun every tagger without caching its output.")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.taggers.split(",") if name.strip()]
+    unknown = [name for name in names if name not in _TAGGERS]
+    if unknown:
+        parser.error("unknown taggers: {0}".format(", ".join(unknown)))
+
+    paths = groundtruth.paths(args.folder)[:args.limit]
+    results = evaluate(paths, names, jobs=args.jobs,
+                       cache_dir=None if args.no_cache else args.cache_dir)
+
+    pd.set_option("display.width", None)
+    print("{0} tagged issues".format(len(paths)))
+    print(results.to_string(index=False, na_rep="",
+                            float_format="{0:.3f}".format))
+
+
+if __name__ == "__main__":
+    main()
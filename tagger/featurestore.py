@@ -0,0 +1,200 @@
+# featurestore.py
+
+import functools
+import hashlib
+import inspect
+import multiprocessing
+import os
+import pickle
+
+import tagger.basetagger as basetagger
+import tagger.lexicon as lexicon
+import tagger.linefeatures as linefeatures
+from tagger.linefeatures import LineFeatures
+
+
+# Classifier features of the lines of each issue, keyed by the issue's text
+# and the feature function, so they are only computed again for new issues or
+# when a feature function changes. Rebuilt when _CACHE_FORMAT, the feature
+# function's module, linefeatures, basetagger or the lexicons change.
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "cache", "features")
+_CACHE_FORMAT = 1
+
+
+def usable_rows(tags_df):
+    """
+    Gets the rows of an issue that classifiers are trained on: the rows with
+    text that is not only whitespace.
+
+    tags_df: DataFrame
+
+    returns: Series
+        Boolean mask of the rows.
+    """
+    return tags_df.text.fillna("").astype(str).str.strip() != ""
+
+
+def get_features(issues, features_funcs, jobs=1, cache_dir=_CACHE_DIR):
+    """
+    Gets the features of the usable rows of each issue for each feature
+    function. The LineFeatures of a line are built once for all the feature
+    functions, and issues missing from the cache are processed in parallel
+    with jobs > 1.
+
+    issues: list
+        Issues to get features of.
+    features_funcs: list
+        Feature functions, each called with the LineFeatures of a line.
+    jobs: int
+        Number of worker processes.
+    cache_dir: str
+        Folder of cached features, or None to always compute them.
+
+    returns: list
+        For each issue, a dict of each feature function to a list with the
+        features of each usable row, in order.
+    """
+    features_funcs = list(dict.fromkeys(features_funcs))
+    results = []
+    tasks = []
+    for issue in issues:
+        texts = issue.tags_df.text[usable_rows(issue.tags_df)].tolist()
+        digest = _texts_digest(texts)
+        features = {}
+        for features_func in features_funcs:
+            entry = None
+            if cache_dir:
+                entry = _read_cache(_cache_filename(digest, features_func,
+                                                    cache_dir), features_func)
+            if entry is not None:
+                features[features_func] = entry["features"]
+        missing = [func for func in features_funcs if func not in features]
+        if missing:
+            tasks.append((len(results), digest, texts, missing))
+        results.append(features)
+
+    if jobs > 1 and len(tasks) > 1:
+        # load the lexicons once here so forked workers inherit them
+        lexicon.all_names()
+        lexicon.non_dictionary_names()
+        with multiprocessing.Pool(processes=jobs) as pool:
+            computed = pool.starmap(_extract, [(texts, missing) for
+                                               (_, _, texts, missing) in tasks])
+    else:
+        computed = [_extract(texts, missing) for (_, _, texts, missing) in tasks]
+
+    for ((index, digest, _, missing), func_features) in zip(tasks, computed):
+        for (features_func, features) in zip(missing, func_features):
+            results[index][features_func] = features
+            if cache_dir:
+                _write_cache(_cache_filename(digest, features_func, cache_dir),
+                             {"version": _features_version(features_func),
+                              "features": features})
+    return results
+
+
+def _extract(texts, features_funcs):
+    """
+    Computes the features of lines for each feature function. Runs in a
+    worker process when getting features with jobs > 1.
+
+    texts: list
+        Text of each line.
+    features_funcs: list
+        Feature functions.
+
+    returns: list
+        For each feature function, the features of each line.
+    """
+    lines = [LineFeatures(text) for text in texts]
+    return [[features_func(line) for line in lines]
+            for features_func in features_funcs]
+
+
+def _texts_digest(texts):
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _features_key(features_func):
+    # Same whether the function's module was imported or run as __main__.
+    module = os.path.splitext(os.path.basename(
+        inspect.getsourcefile(features_func)))[0]
+    return "{0}.{1}".format(module, features_func.__qualname__)
+
+
+def _cache_filename(digest, features_func, cache_dir):
+    return os.path.join(cache_dir, "{0}_{1}.pickle".format(
+        digest[:16], _features_key(features_func)))
+
+
+@functools.lru_cache(maxsize=None)
+def _features_version(features_func):
+    """
+    Gets what the features of a line depend on besides its text.
+
+    features_func: func
+        Feature function.
+
+    returns: str
+    """
+    digest = hashlib.sha1()
+    digest.update("{0} {1}\n".format(_CACHE_FORMAT,
+                                     _features_key(features_func)).encode("utf-8"))
+    # Feature functions use LineFeatures, the lexicons and
+    # basetagger.create_features_for_ranges().
+    for source in [inspect.getsourcefile(features_func), linefeatures.__file__,
+                   lexicon.__file__, basetagger.__file__]:
+        with open(source, "rb") as source_file:
+            digest.update(hashlib.sha1(source_file.read()).digest())
+    digest.update(lexicon.version().encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read_cache(filename, features_func):
+    """
+    Reads cached features.
+
+    filename: str
+        Cache file.
+    features_func: func
+        Feature function the features were computed with.
+
+    returns: dict, or None if the file is missing or out of date
+    """
+    try:
+        with open(filename, "rb") as cache_file:
+            entry = pickle.load(cache_file)
+        version = entry["version"]
+    except (OSError, EOFError, pickle.UnpicklingError, ImportError,
+            AttributeError, KeyError, TypeError):
+        return None
+    if version != _features_version(features_func):
+        return None
+    return entry
+
+
+def _write_cache(filename, entry):
+    """
+    Writes cached features. Failing to write, e.g. to a read-only install,
+    only means the features are computed again by the next process.
+
+    filename: str
+        Cache file.
+    entry: dict
+        Cached features and the version they were computed with.
+
+    returns: None
+    """
+    tmp_filename = "{0}.{1}.tmp".format(filename, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmp_filename, "wb") as cache_file:
+            pickle.dump(entry, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+    except OSError:
+        pass
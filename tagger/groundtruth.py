@@ -0,0 +1,242 @@
+# groundtruth.py
+
+import functools
+import glob
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+
+import tagger.basetagger as basetagger
+from tagger.basetagger import Issue
+import tagger.schema as schema
+
+
+# Folder of manually tagged csv files, relative to the working directory.
+DEFAULT_FOLDER = "tagged_data"
+
+# Parsed tags_df of each tagged file, so the csv is only parsed again when it
+# changes. Rebuilt when _CACHE_FORMAT, pandas, this module, basetagger or the
+# schema changes.
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "cache", "groundtruth")
+_CACHE_FORMAT = 1
+
+# Tagged files loaded by this process, keyed by full filename. Each value is
+# ((mtime, size) of the file, tags_df).
+_TAGGED = {}
+
+
+class TaggedIssue(Issue):
+    """
+    Represents a manually tagged newspaper issue. Its tags_df is only loaded,
+    from the cache if possible, the first time it is used.
+
+    path: str
+        Tagged csv file.
+    filename: str
+        Filename of the issue (default: path).
+    prepare: func
+        Called with the loaded tags_df and returns the tags_df to use.
+    """
+
+    def __init__(self, path, filename=None, prepare=None):
+        self.path = path
+        self.prepare = prepare
+        Issue.__init__(self, None, filename or path)
+
+    @property
+    def tags_df(self):
+        if self._tags_df is None:
+            tags_df = load_tagged(self.path)
+            self._tags_df = self.prepare(tags_df) if self.prepare else tags_df
+        return self._tags_df
+
+    @tags_df.setter
+    def tags_df(self, tags_df):
+        self._tags_df = tags_df
+
+
+def paths(folder=DEFAULT_FOLDER):
+    """
+    Gets the tagged csv files in a folder.
+
+    folder: str
+        Folder name.
+
+    returns: list
+    """
+    return sorted(glob.glob(os.path.join(os.path.abspath(folder), "*.csv")))
+
+
+def get_tagged_issues(folder=DEFAULT_FOLDER, prepare=None):
+    """
+    Gets a TaggedIssue for every tagged csv file in a folder. No file is read
+    until its issue's tags_df is used.
+
+    folder: str
+        Folder name.
+    prepare: func
+        Passed to each TaggedIssue.
+
+    returns: list
+    """
+    return [TaggedIssue(path, os.path.basename(path), prepare)
+            for path in paths(folder)]
+
+
+def load_tagged(filename, cache_dir=_CACHE_DIR):
+    """
+    Gets the tags_df of a tagged csv file, as parsed by
+    Issue.generate_tags_df(). Each file is parsed once and cached in
+    cache_dir; the cache is used while the file's mtime and size are
+    unchanged, or its contents are if they are not.
+
+    filename: str
+        Tagged csv file.
+    cache_dir: str
+        Folder of cached tags_dfs.
+
+    returns: DataFrame
+        A new copy, which the caller may modify.
+    """
+    full_filename = os.path.abspath(filename)
+    version = _file_version(full_filename)
+
+    cached = _TAGGED.get(full_filename)
+    if cached is None or cached[0] != version:
+        cache_filename = _cache_filename(full_filename, cache_dir)
+        entry = _read_cache(cache_filename)
+        if entry is not None and entry["file"] != version:
+            # Touched but maybe not changed.
+            if entry["sha1"] != _file_digest(full_filename):
+                entry = None
+            else:
+                entry["file"] = version
+                _write_cache(cache_filename, entry)
+        if entry is None:
+            entry = {"version": _cache_version(),
+                     "file": version,
+                     "sha1": _file_digest(full_filename),
+                     "tags_df": Issue.generate_tags_df(full_filename)}
+            _write_cache(cache_filename, entry)
+        cached = (version, entry["tags_df"])
+        _TAGGED[full_filename] = cached
+    return cached[1].copy()
+
+
+def drop_blank(tags_df):
+    """
+    Drops the rows of a tagged file that are completely empty.
+
+    tags_df: DataFrame
+
+    returns: DataFrame
+    """
+    blank = (tags_df.drop(columns="jump").isnull().all(axis=1) &
+             (tags_df.jump == schema.JUMP_NONE))
+    return tags_df[~blank]
+
+
+def unique_index(tags_df):
+    """
+    Numbers the rows 1 to n, as in the LINE column, if some rows of a tagged
+    file have no LINE number or share one.
+
+    tags_df: DataFrame
+
+    returns: DataFrame
+    """
+    if tags_df.index.is_unique and tags_df.index.notnull().all():
+        return tags_df
+    tags_df.index = pd.RangeIndex(1, len(tags_df) + 1)
+    return tags_df
+
+
+def _file_version(filename):
+    # Changes whenever the file is rewritten.
+    stat = os.stat(filename)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _file_digest(filename):
+    digest = hashlib.sha1()
+    with open(filename, "rb") as file_in:
+        digest.update(file_in.read())
+    return digest.hexdigest()
+
+
+def _cache_filename(full_filename, cache_dir):
+    key = hashlib.sha1(full_filename.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "{0}_{1}.pickle".format(
+        os.path.splitext(os.path.basename(full_filename))[0], key[:12]))
+
+
+@functools.lru_cache(maxsize=None)
+def _cache_version():
+    """
+    Gets what a cached tags_df depends on besides its tagged file.
+
+    returns: str
+    """
+    digest = hashlib.sha1()
+    digest.update("{0} {1}\n".format(_CACHE_FORMAT, pd.__version__).encode("utf-8"))
+    # The parse is Issue.generate_tags_df() followed by schema.apply().
+    for source in [basetagger.__file__, schema.__file__, __file__]:
+        digest.update(_file_digest(source).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read_cache(filename):
+    """
+    Reads a cached tags_df.
+
+    filename: str
+        Cache file.
+
+    returns: dict, or None if the file is missing or out of date
+    """
+    try:
+        with open(filename, "rb") as cache_file:
+            entry = pickle.load(cache_file)
+        version = entry["version"]
+    except (OSError, EOFError, pickle.UnpicklingError, ImportError,
+            AttributeError, KeyError, TypeError):
+        return None
+    if version != _cache_version():
+        return None
+    return entry
+
+
+def _write_cache(filename, entry):
+    """
+    Writes a cached tags_df. Failing to write, e.g. to a read-only install,
+    only means the file is parsed again by the next process.
+
+    filename: str
+        Cache file.
+    entry: dict
+        Cached tags_df and the versions it was built from.
+
+    returns: None
+    """
+    tmp_filename = "{0}.{1}.tmp".format(filename, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmp_filename, "wb") as cache_file:
+            pickle.dump(entry, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+    except OSError:
+        pass
+
+
+def main():
+    tagged_paths = paths()
+    for path in tagged_paths:
+        load_tagged(path)
+    print("{0}: {1} tagged issues cached".format(_CACHE_DIR, len(tagged_paths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -71,12 +71,14 @@ def _has_page_jump(text):
         return -1
 
 
-def tag(issue):
+def tag(issue, inplace=False):
     """
     Tags the issue's JUMP column.
 
     issue: obj
         Issue object to apply tags to.
+    inplace: bool
+        Whether to tag issue itself instead of a copy of it (default=False).
 
     return: obj
     """
@@ -84,16 +86,17 @@ def tag(issue):
     print("Tagging %s..." %issue.filename)
 
     # Labels rows.
-    issue = copy.deepcopy(issue)
+    if not inplace:
+        issue = issue.copy()
     for index, row in issue.tags_df.iterrows():
-        issue.tags_df.loc[index, "jump"] = '0'
+        issue.tags_df.loc[index, "jump"] = schema.JUMP_NONE
 
         # If text is not null then search for JUMP.
         if not pd.isnull(row.text):
             text = row.text.strip()
             jump = _has_page_jump(text)
             if jump:
-                issue.tags_df.loc[index, "jump"] = str(jump)
+                issue.tags_df.loc[index, "jump"] = schema.jump_code(jump)
 
                 # If 'function' column is not null set based on number of words.
                 if pd.isnull(row.function):
@@ -1,12 +1,11 @@
 # junktagger.py
 # Nupur Garg
 
-from nltk.corpus import names
-import enchant
 import random
 import re
 
 from tagger.basetagger import *
+import tagger.lexicon as lexicon
 
 
 # Global classifiers metadata.
@@ -18,36 +17,12 @@ _SHUFFLE = False
 _REQUIRED_TAGS = ["PI", "HL", "BL"]
 _TAGS_TO_KEEP = _REQUIRED_TAGS + ["PL"]
 
-# English dictionary.
-_ENGLISH_DICTIONARY = enchant.Dict("en_US")
-
-# All English names.
-_ENGLISH_ALL_NAMES = names.words("female.txt") + names.words("male.txt")
-_ENGLISH_ALL_NAMES_STR = "|".join(_ENGLISH_ALL_NAMES)
-
-# English names not in the dictionary.
-_ENGLISH_NAMES = [word.lower() for word in _ENGLISH_ALL_NAMES
-                               if not _ENGLISH_DICTIONARY.check(word)]
-_ENGLISH_NAMES_STR = "\W|\W".join(_ENGLISH_NAMES)
-
 
 # ===============================================
 # ========= CLASSIFIER HELPER FUNCTIONS =========
 # ===============================================
 
 
-def _preprocess_text(text):
-    """
-    Preprocesses text by stripping and replacing the "\t".
-
-    text: str
-        Text to perofrm analysis on.
-
-    returns: str
-    """
-    return text.strip().replace("\t", " ")
-
-
 def _is_section_header(text):
     """
     Determines if the text is a section header (SH).
@@ -94,19 +69,20 @@ def _is_section_header(text):
     return False
 
 
-def _features_stats_alphabetic(text):
+def _features_stats_alphabetic(line):
     """
     Gets features on the alphabetic characteristics of the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
+    text = line.text
 
     # Percent alphabetic.
-    alphabetic = re.sub(r"[^A-Za-z\ ]+", "", text)
+    alphabetic = line.alphabetic
     percent = len(alphabetic) / float(len(text))
     features.update(create_features_for_ranges(feature_name="percent_alpha",
                                                variable=percent,
@@ -129,21 +105,21 @@ def _features_stats_alphabetic(text):
     return features
 
 
-def _features_stats_uppercase(text):
+def _features_stats_uppercase(line):
     """
     Gets features on the uppercase characteristics of the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
-    words = text.split(" ")
+    text = line.text
+    words = line.words
 
     # Percent uppercase.
-    alphabetic = re.sub(r"[^A-Z]+", "", text)
-    percent = len(alphabetic) / float(len(text))
+    percent = line.num_uppercase / float(len(text))
     features.update(create_features_for_ranges(feature_name="percent_uppercase",
                                                variable=percent,
                                                ranges=[0.05, 0.1, 0.2, 0.8, 0.9, 0.95]))
@@ -155,19 +131,18 @@ def _features_stats_uppercase(text):
     return features
 
 
-def _features_stats_dictionary(text):
+def _features_stats_dictionary(line):
     """
     Gets features on the dictionary from the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
-    words = text.lower().split(" ")
-    words_synset = [word for word in words
-                         if word and _ENGLISH_DICTIONARY.check(word)]
+    words = line.lower_words
+    words_synset = [word for word, hit in zip(words, line.lower_word_hits) if hit]
 
     # Percent words in dictionary.
     percent = len(words_synset) / float(len(words))
@@ -193,20 +168,21 @@ def _features_stats_dictionary(text):
     return features
 
 
-def _features_stats_names(text):
+def _features_stats_names(line):
     """
     Gets features on the names in the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
-    words = text.split(" ")
-    words_synset = [word for word in words
-                         if (word and _ENGLISH_DICTIONARY.check(word) and
-                             word not in _ENGLISH_ALL_NAMES)]
+    text = line.text
+    words = line.words
+    all_names = lexicon.all_names()
+    words_synset = [word for word, hit in zip(words, line.word_hits)
+                         if hit and word not in all_names]
 
     # Number of names.
     features.update(create_features_for_ranges(feature_name="num_names",
@@ -232,20 +208,20 @@ def _features_stats_names(text):
     return features
 
 
-def _features_stats_numerals(text):
+def _features_stats_numerals(line):
     """
     Gets features on the numerals of the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
+    text = line.text
 
     # Percent of characters that are numerals.
-    numerals = re.sub(r"\d+", "", text)
-    percent = len(numerals) / float(len(text))
+    percent = (len(text) - line.num_digits) / float(len(text))
     features.update(create_features_for_ranges(feature_name="percent_numerals",
                                                variable=percent,
                                                ranges=[0.35, 0.7, 0.9, 0.98]))
@@ -255,20 +231,20 @@ def _features_stats_numerals(text):
     return features
 
 
-def _features_stats_non_alphabetic(text):
+def _features_stats_non_alphabetic(line):
     """
     Gets features on the non-alphabetic characteristics of the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
+    text = line.text
 
     # Gets ascii vs non-ascii letters.
-    alphabetic = re.sub(r"[^\x00-\x7F]+", "", text)
-    percent = len(alphabetic) / float(len(text))
+    percent = line.num_ascii / float(len(text))
     features.update(create_features_for_ranges(feature_name='percent_ascii',
                                                variable=percent,
                                                ranges=[0.8, 0.9, 0.96]))
@@ -288,22 +264,23 @@ def _features_stats_non_alphabetic(text):
     return features
 
 
-def _features_stats_positional(text):
+def _features_stats_positional(line):
     """
     Gets features based on the position in the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
-    words = text.lower().split(" ")
+    text = line.text
+    words = line.lower_words
     word = words[-1][:-1].strip()
 
     # Last word has a period.
     features["ends_period"] = bool(re.search(r"\.|\!$", text))
-    features["ends_word"] = (_ENGLISH_DICTIONARY.check(word)
+    features["ends_word"] = (lexicon.check(word)
                              if word and word[-1].isalpha() else False)
     features["ends_word_1_word"] = features["ends_word"] and len(words) == 1
     features["ends_word_long"] = features["ends_word"] and len(word) >= 5
@@ -318,7 +295,7 @@ def _features_stats_positional(text):
     features["has_simple_quotation"] = bool(re.search(r"\“.*\”", text))
     features["starts_quotation"] = bool(re.search(r"^%s" %quotations, text))
     features["ends_period_quotation"] = bool(re.search(r"\.%s$" %quotations, text))
-    features["ends_word_period_quotation"] = (_ENGLISH_DICTIONARY.check(word[:-1])
+    features["ends_word_period_quotation"] = (lexicon.check(word[:-1])
                                               if (features["ends_period_quotation"] and
                                                   word[:-1] and word[-2].isalpha()) else False)
 
@@ -330,18 +307,18 @@ def _features_stats_positional(text):
     return features
 
 
-def _features_stats_word_patterns(text):
+def _features_stats_word_patterns(line):
     """
     Gets features on the word patterns within the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
-    text = text.lower()
-    words = text.split(' ')
+    text = line.lower
+    words = line.lower_words
 
     # Special words to exclude.
     features["has_addressings"] = bool(re.search(r"by|dear ", text)) and len(words) == 3
@@ -354,18 +331,17 @@ def _features_stats_word_patterns(text):
     return features
 
 
-def _features_stats_patterns(text):
+def _features_stats_patterns(line):
     """
     Gets features on the patterns within the text.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
-    text = text.lower()
-    words = text.split(' ')
+    text = line.lower
 
     # Special words to exclude.
     features["has_positions"] = bool(re.search(r"editor|manager|adviser", text))
@@ -394,90 +370,86 @@ def _features_stats_patterns(text):
 # ========================================
 
 
-def _generate_features_advertisement(data):
+def _generate_features_advertisement(line):
     """
     Generates a classifier that identify an advertisement (AT).
 
-    data: obj
-       Series containing issue data.
+    line: obj
+       LineFeatures of the row.
 
     returns: dict
     """
     features = {}
-    text = _preprocess_text(data.text)
 
-    features.update(_features_stats_alphabetic(text))
-    features.update(_features_stats_uppercase(text))
-    features.update(_features_stats_dictionary(text))
-    features.update(_features_stats_numerals(text))
-    features.update(_features_stats_non_alphabetic(text))
-    features.update(_features_stats_positional(text))
-    features.update(_features_stats_word_patterns(text))
-    features.update(_features_stats_patterns(text))
+    features.update(_features_stats_alphabetic(line))
+    features.update(_features_stats_uppercase(line))
+    features.update(_features_stats_dictionary(line))
+    features.update(_features_stats_numerals(line))
+    features.update(_features_stats_non_alphabetic(line))
+    features.update(_features_stats_positional(line))
+    features.update(_features_stats_word_patterns(line))
+    features.update(_features_stats_patterns(line))
 
     return features
 
 
-def _generate_features_unintelligible(data):
+def _generate_features_unintelligible(line):
     """
     Generates a classifier that identify text as unintelligible (N).
 
-    data: obj
-       Series containing issue data.
+    line: obj
+       LineFeatures of the row.
 
     returns: dict
     """
     features = {}
-    text = _preprocess_text(data.text)
 
-    features.update(_features_stats_alphabetic(text))
-    features.update(_features_stats_names(text))
-    features.update(_features_stats_uppercase(text))
-    features.update(_features_stats_numerals(text))
-    features.update(_features_stats_non_alphabetic(text))
-    features.update(_features_stats_positional(text))
-    features.update(_features_stats_word_patterns(text))
-    features.update(_features_stats_patterns(text))
+    features.update(_features_stats_alphabetic(line))
+    features.update(_features_stats_names(line))
+    features.update(_features_stats_uppercase(line))
+    features.update(_features_stats_numerals(line))
+    features.update(_features_stats_non_alphabetic(line))
+    features.update(_features_stats_positional(line))
+    features.update(_features_stats_word_patterns(line))
+    features.update(_features_stats_patterns(line))
 
     return features
 
 
-def _generate_features_other(data):
+def _generate_features_other(line):
     """
     Generates a classifier that identify text as other (OT).
 
-    data: obj
-       Series containing issue data.
+    line: obj
+       LineFeatures of the row.
 
     returns: dict
     """
     features = {}
-    text = _preprocess_text(data.text)
 
-    features.update(_features_stats_uppercase(text))
-    features.update(_features_stats_non_alphabetic(text))
-    features.update(_features_stats_positional(text))
-    features.update(_features_stats_word_patterns(text))
-    features.update(_features_stats_patterns(text))
+    features.update(_features_stats_uppercase(line))
+    features.update(_features_stats_non_alphabetic(line))
+    features.update(_features_stats_positional(line))
+    features.update(_features_stats_word_patterns(line))
+    features.update(_features_stats_patterns(line))
 
     return features
 
 
-def _generate_features_header(data):
+def _generate_features_header(line):
     """
     Generates a classifier that identify text as photo header (PH) or masthead (MH).
 
-    data: obj
-       Series containing issue data.
+    line: obj
+       LineFeatures of the row.
 
     returns: dict
     """
     features = {}
-    text = _preprocess_text(data.text)
 
-    features.update(_features_stats_names(text))
-    features.update(_features_stats_uppercase(text))
-    features.update(_features_stats_patterns(text))
+    features.update(_features_stats_names(line))
+    features.update(_features_stats_uppercase(line))
+    features.update(_features_stats_patterns(line))
 
     return features
 
@@ -487,187 +459,153 @@ def _generate_features_header(data):
 # =====================================
 
 
-def _tag_blank(row):
+def _tag_blank(rows):
     """
-    Tags the row as blank (B) if the row's text is np.nan.
+    Tags the rows as blank (B) if the row's text is np.nan or whitespace.
 
-    row: obj
-        DataFrame row to return value for.
+    rows: obj
+        DataFrame rows to return labels for.
 
-    returns: str
+    returns: np.array
     """
-    if (pd.isnull(row.function) and
-        (pd.isnull(row.text) or (not bool(row.text)) or
-         re.search(r"^[\t\s]+$", row.text))):
-        return "B"
-    return row.function
+    text = rows.text
+    is_blank = (text.isnull() | (text == "") |
+                text.str.match(r"^[\t\s]+$", na=False))
+    return np.where(is_blank, "B", None)
 
 
-def _tag_jump(row):
+def _tag_jump(rows):
     """
     Tags any row with a jump (JUMP).
 
-    row: obj
-        DataFrame row to return value for.
+    rows: obj
+        DataFrame rows to return labels for.
 
-    returns: str
+    returns: np.array
     """
-    if pd.isnull(row.function):
-        if has_page_jump(row.text):
-            return "JUMP"
-    return row.function
+    return np.where(rows.text.map(has_page_jump), "JUMP", None)
 
 
-def _tag_section_header(row):
+def _tag_section_header(rows):
     """
     Tags any row as a section header (SH).
 
-    row: obj
-        DataFrame row to return value for.
+    rows: obj
+        DataFrame rows to return labels for.
 
-    returns: str
+    returns: np.array
     """
-    if pd.isnull(row.function):
-        if _is_section_header(row.text):
-            return "SH"
-    return row.function
+    return np.where(rows.text.map(_is_section_header), "SH", None)
 
 
-def _tag_unintelligible(row, classifier, features_func):
+def _tag_unintelligible(rows, classify):
     """
-    Tags the row as unintelligible (N) if there are not two consequtive
+    Tags the rows as unintelligible (N) if there are not two consequtive
     alphanumeric characters or if the classifier indicates True.
 
-    row: obj
-        DataFrame row to return value for.
-    classifier: obj
-        Classifier.
-    features_func: func
-        Function that generates the features.
+    rows: obj
+        DataFrame rows to return labels for.
+    classify: func
+        Classifies rows with the classifier.
 
-    returns: str
+    returns: np.array
     """
-    if pd.isnull(row.function):
-        if not re.search(r"\w+", row.text):
-            return "N"
-        if classifier.classify(features_func(row)):
-            return "N"
-    return row.function
+    is_unintelligible = ~rows.text.str.contains(r"\w", regex=True, na=False).values
+    has_words = ~is_unintelligible
+    is_unintelligible[has_words] = classify(rows.loc[has_words])
+    return np.where(is_unintelligible, "N", None)
 
 
-def _tag_advertisement(row, classifier, features_func):
+def _tag_advertisement(rows, classify):
     """
-    Tags the row as advertisement (AT) if the classifier indicates True.
+    Tags the rows as advertisement (AT) if the classifier indicates True.
 
-    row: obj
-        DataFrame row to return value for.
-    classifier: obj
-        Classifier.
-    features_func: func
-        Function that generates the features.
+    rows: obj
+        DataFrame rows to return labels for.
+    classify: func
+        Classifies rows with the classifier.
 
-    returns: str
+    returns: np.array
     """
-    if pd.isnull(row.function):
-        if classifier.classify(features_func(row)):
-            return "AT"
-    return row.function
+    return np.where(classify(rows), "AT", None)
 
 
-def _tag_other(row, classifier, features_func):
+def _tag_other(rows, classify):
     """
-    Tags the row as other (OT) if the classifier indicates True.
+    Tags the rows as other (OT) if the classifier indicates True.
 
-    row: obj
-        DataFrame row to return value for.
-    classifier: obj
-        Classifier.
-    features_func: func
-        Function that generates the features.
+    rows: obj
+        DataFrame rows to return labels for.
+    classify: func
+        Classifies rows with the classifier.
 
-    returns: str
+    returns: np.array
     """
-    if pd.isnull(row.function):
-        if classifier.classify(features_func(row)):
-            return "OT"
-    return row.function
+    return np.where(classify(rows), "OT", None)
 
 
-def _tag_headers(row, classifier, features_func):
+def _tag_headers(rows, classify):
     """
-    Tags the row as masthead (MH) if the classifier indicates True.
+    Tags the rows as masthead (MH) if the classifier indicates True.
 
-    row: obj
-        DataFrame row to return value for.
-    classifier: obj
-        Classifier.
-    features_func: func
-        Function that generates the features.
+    rows: obj
+        DataFrame rows to return labels for.
+    classify: func
+        Classifies rows with the classifier.
 
-    returns: str
+    returns: np.array
     """
-    if pd.isnull(row.function):
-        if classifier.classify(features_func(row)):
-            return "MH"
-    return row.function
+    return np.where(classify(rows), "MH", None)
 
 
-def _tag_in_range(row):
+def _count_dictionary_words(text):
     """
-    Tags the row based on previous row if the previous or next row are:
-        - unintelligible (N)
-        - other (OT)
-        - advertisement (AT)
+    Counts the words in the text that are in the English dictionary.
 
-    row: obj
-        DataFrame row to return value for.
+    text: str
+        Text to perform analysis on.
 
-    returns: str
+    returns: int
     """
-    _get_synset = lambda text: [word for word in text.lower().split(" ")
-                               if word and _ENGLISH_DICTIONARY.check(word)]
-    valid_funcs = ["B", "AT", "N", "CT", "CN", "OT", "PH", "MH", "BQA", "BQN", "BQT", "NP", "SH", "HL"]
-    if pd.isnull(row.function) or row.function == "HL":
-        surrounding = {"prev": row.func_prev in valid_funcs,
-                       "next": row.func_next in valid_funcs,
-                       "prev_two": row.func_prev_two in valid_funcs,
-                       "next_two": row.func_next_two in valid_funcs}
-
-        # Checks previous and next functions for junk.
-        if surrounding["prev"] and surrounding["next"]:
-            words_synset = _get_synset(row.text)
-
-            # Returns previous row function if fewer than 5 words.
-            if len(words_synset) <= 5:
-                return "N"
-            # Returns previous row function two above and below are junk.
-            if surrounding["prev_two"] and surrounding["next_two"]:
-                return "N"
-
-        # Returns "N" if 3 out of 4 are junk and words synset is less than 20.
-        if sum(surrounding.values()) >= 3:
-            words_synset = _get_synset(row.text)
-            if len(words_synset) < 20:
-                return "N"
-    return row.function
+    return len([word for word in text.lower().split(" ")
+                     if word and lexicon.check(word)])
 
 
 def _apply_in_range(issue):
     """
-    Determines unintelligible text based on surrounding the rows.
+    Determines unintelligible text based on surrounding the rows. Untagged and
+    headline (HL) rows are tagged unintelligible (N) if:
+        - the previous and next rows are junk and it has at most 5
+          dictionary words
+        - the two rows above and the two rows below are junk
+        - 3 out of those 4 rows are junk and it has fewer than 20 dictionary
+          words
 
     issue: obj
         Issue object to apply tags to.
 
     returns: None
     """
-    issue.tags_df["func_prev"] = issue.tags_df['function'].shift(periods=1)
-    issue.tags_df["func_next"] = issue.tags_df['function'].shift(periods=-1)
-    issue.tags_df["func_prev_two"] = issue.tags_df['function'].shift(periods=2)
-    issue.tags_df["func_next_two"] = issue.tags_df['function'].shift(periods=-2)
-    issue.tags_df["function"] = issue.tags_df.apply(lambda row: _tag_in_range(row), axis=1)
-    issue.tags_df.drop(["func_prev", "func_next", "func_prev_two", "func_next_two"],
-                       axis=1, inplace=True)
+    valid_funcs = ["B", "AT", "N", "CT", "CN", "OT", "PH", "MH", "BQA", "BQN", "BQT", "NP", "SH", "HL"]
+    function = issue.tags_df["function"]
+    is_junk = function.isin(valid_funcs)
+    prev, next_, prev_two, next_two = [is_junk.shift(periods=periods).fillna(False).astype(bool)
+                                       for periods in [1, -1, 2, -2]]
+    num_junk = (prev.astype(int) + next_.astype(int) +
+                prev_two.astype(int) + next_two.astype(int))
+
+    # Only untagged and headline rows surrounded by junk are candidates.
+    candidates = ((function.isnull() | (function == "HL")) &
+                  ((prev & next_) | (num_junk >= 3)))
+    if not candidates.any():
+        return
+    num_words = pd.Series(0, index=function.index)
+    num_words[candidates] = issue.tags_df.text[candidates].map(_count_dictionary_words)
+
+    is_unintelligible = candidates & (
+        (prev & next_ & ((num_words <= 5) | (prev_two & next_two))) |
+        ((num_junk >= 3) & (num_words < 20)))
+    issue.tags_df.loc[is_unintelligible, "function"] = "N"
 
 
 # ==================================
@@ -675,7 +613,7 @@ def _apply_in_range(issue):
 # ==================================
 
 
-def tag(issue):
+def tag(issue, inplace=False):
     """
     Tags the issue with the following extraneous tags:
         B - Blank line
@@ -683,31 +621,35 @@ def tag(issue):
 
     issue: obj
         Issue object to apply tags to.
+    inplace: bool
+        Whether to tag issue itself instead of a copy of it (default=False).
 
     return: obj
     """
     assert check_tags_exist(issue, _REQUIRED_TAGS)
 
     # Labels rows.
-    issue = copy.deepcopy(issue)
-    issue.apply(col="function", label_func=_tag_blank)
-    issue.apply(col="function", label_func=_tag_jump)
-    issue.apply(col="function", label_func=_tag_section_header)
+    if not inplace:
+        issue = issue.copy()
+    issue.label(label_func=_tag_blank)
+    issue.label(label_func=_tag_jump)
+    issue.label(label_func=_tag_section_header)
 
     # Labels rows with classifiers.
     for classifiers in _JUNKTAGGER_CLASSIFIERS:
         filename = classifiers[0]
         features_func = classifiers[1]
         label_func = classifiers[3]
-        issue.apply_classifier(col="function", filename=filename,
-                               features_func=features_func, label_func=label_func)
+        issue.label_with_classifier(filename=filename, features_func=features_func,
+                                    label_func=label_func)
 
     # Labels rows based labels on nearby rows.
     for idx in range(3):
         _apply_in_range(issue)
 
     # Remove JUMP tag prior to returning the issue.
-    issue.tags_df.function.replace("JUMP", np.nan, inplace=True)
+    issue.tags_df["function"] = issue.tags_df.function.where(
+        issue.tags_df.function != "JUMP")
     return issue
 
 
@@ -736,14 +678,11 @@ def main():
     # Create classifiers.
     if _REGENERATE_CLASSIFIERS:
         print("Regenerating classifiers...")
-        for classifiers in _JUNKTAGGER_CLASSIFIERS:
-            filename = classifiers[0]
-            func = classifiers[1]
-            tags = classifiers[2]
-            create_classifier(issues=issues[:split],
-                              classifier_func=create_naive_bayes_classifier,
-                              features_func=func, filename=filename, tags=tags,
-                              stats=True, debug=False)
+        training_sets = [(issues[:split], classifiers[0], classifiers[1], classifiers[2])
+                         for classifiers in _JUNKTAGGER_CLASSIFIERS]
+        create_classifiers(training_sets,
+                           classifier_func=create_naive_bayes_classifier,
+                           jobs=os.cpu_count() or 1, stats=True, debug=False)
 
     # Tags the untagged issues.
     print("Tagging issues...")
@@ -0,0 +1,204 @@
+# lexicon.py
+
+import functools
+import hashlib
+import json
+import os
+
+
+# Words whose dictionary lookups are remembered.
+_CHECK_CACHE_SIZE = 1 << 18
+
+# Name lexicons built by _build_names(), so later processes do not have to
+# load the names corpus and spell check every name again. Rebuilt when
+# _CACHE_FORMAT, the installed nltk or pyenchant, or a corpus file changes.
+_CACHE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "cache", "lexicons.json")
+_CACHE_FORMAT = 1
+
+# Loaded on first use and then shared by every tagger in the process.
+_DICTIONARY = None
+_ALL_NAMES = None
+_NON_DICTIONARY_NAMES = None
+
+
+def _get_dictionary():
+    global _DICTIONARY
+    if _DICTIONARY is None:
+        import enchant
+        _DICTIONARY = enchant.Dict("en_US")
+    return _DICTIONARY
+
+
+@functools.lru_cache(maxsize=_CHECK_CACHE_SIZE)
+def check(word):
+    """
+    Checks whether a word is in the English dictionary. Results are
+    remembered, so each distinct word is only looked up in enchant once.
+
+    word: str
+        Non-empty word to look up.
+
+    returns: bool
+    """
+    return _get_dictionary().check(word)
+
+
+def all_names():
+    """
+    Gets every English first name in the NLTK names corpus, as spelled there.
+
+    returns: frozenset
+    """
+    if _ALL_NAMES is None:
+        _load_names()
+    return _ALL_NAMES
+
+
+def non_dictionary_names():
+    """
+    Gets the lowercased English first names that are not dictionary words.
+
+    returns: frozenset
+    """
+    if _NON_DICTIONARY_NAMES is None:
+        _load_names()
+    return _NON_DICTIONARY_NAMES
+
+
+def version():
+    """
+    Gets a key that changes whenever dictionary lookups or the names corpus
+    may give different results: with the installed nltk or pyenchant, the
+    NLTK data folder, or _CACHE_FORMAT. Caches of anything computed from the
+    lexicons include it in their versions.
+
+    returns: str
+    """
+    return hashlib.sha1(json.dumps(_cache_version([]), sort_keys=True)
+                        .encode("utf-8")).hexdigest()
+
+
+def _load_names(filename=_CACHE_FILENAME):
+    """
+    Sets the name lexicons from the cache file, building it first if it is
+    missing or out of date.
+
+    filename: str
+        Cache file.
+
+    returns: None
+    """
+    global _ALL_NAMES, _NON_DICTIONARY_NAMES
+
+    lexicons = _read_cache(filename)
+    if lexicons is None:
+        lexicons = _build_names()
+        _write_cache(filename, lexicons)
+
+    _ALL_NAMES = frozenset(lexicons["all_names"])
+    _NON_DICTIONARY_NAMES = frozenset(lexicons["non_dictionary_names"])
+
+
+def _build_names():
+    """
+    Builds the name lexicons from the NLTK names corpus.
+
+    returns: dict
+    """
+    from nltk.corpus import names
+
+    all_names = names.words("female.txt") + names.words("male.txt")
+    sources = [names.abspath(fileid) for fileid in ["female.txt", "male.txt"]]
+    return {"version": _cache_version([str(source) for source in sources]),
+            "all_names": sorted(set(all_names)),
+            "non_dictionary_names": sorted(set(name.lower()
+                                               for name in all_names
+                                               if not check(name)))}
+
+
+def _cache_version(sources):
+    """
+    Gets what the lexicons built from the corpus files in sources depend on.
+    Cheap to compute, so a cache can be checked without importing nltk.
+
+    sources: list
+        Paths of the corpus files.
+
+    returns: dict
+    """
+    from importlib import metadata
+
+    packages = {}
+    for package in ["nltk", "pyenchant"]:
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            packages[package] = None
+
+    files = {}
+    for source in sources:
+        try:
+            stat = os.stat(source)
+            files[source] = [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            files[source] = None
+
+    return {"format": _CACHE_FORMAT,
+            "packages": packages,
+            "nltk_data": os.environ.get("NLTK_DATA"),
+            "files": files}
+
+
+def _read_cache(filename):
+    """
+    Reads the lexicons from the cache file.
+
+    filename: str
+        Cache file.
+
+    returns: dict, or None if the file is missing or out of date
+    """
+    try:
+        with open(filename, "r", encoding="utf-8") as cache_file:
+            lexicons = json.load(cache_file)
+        version = lexicons["version"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if version != _cache_version(list(version.get("files", {}))):
+        return None
+    return lexicons
+
+
+def _write_cache(filename, lexicons):
+    """
+    Writes the lexicons to the cache file. Failing to write, e.g. to a
+    read-only install, only means the next process builds them again.
+
+    filename: str
+        Cache file.
+    lexicons: dict
+        Lexicons from _build_names().
+
+    returns: None
+    """
+    tmp_filename = "{0}.{1}.tmp".format(filename, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmp_filename, "w", encoding="utf-8") as cache_file:
+            json.dump(lexicons, cache_file)
+        os.replace(tmp_filename, filename)
+    except OSError:
+        pass
+
+
+def main():
+    lexicons = _build_names()
+    _write_cache(_CACHE_FILENAME, lexicons)
+    print("{0}: {1} names, {2} not in the dictionary".format(
+        _CACHE_FILENAME, len(lexicons["all_names"]),
+        len(lexicons["non_dictionary_names"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# linefeatures.py
+
+import re
+import string
+
+import tagger.lexicon as lexicon
+
+
+# Tokens that are not counted as words.
+PUNCTUATION = string.punctuation + "''"
+
+
+def _word_tokenize(text):
+    # nltk is slow to import, so it is only imported once text is tokenized.
+    from nltk import word_tokenize
+    return word_tokenize(text)
+
+
+def _cached(func):
+    """
+    Turns func into a read-only property that is computed on first access
+    and then stored on the LineFeatures object.
+    """
+    name = func.__name__
+
+    def getter(self):
+        try:
+            return self._values[name]
+        except KeyError:
+            value = self._values[name] = func(self)
+            return value
+    return property(getter, doc=func.__doc__)
+
+
+class LineFeatures(object):
+    """
+    Values derived from a single line of an issue that the feature functions
+    of several taggers need. Each value is computed the first time a tagger
+    asks for it and reused by every tagger after that.
+
+    raw: str
+        Text of the line.
+    """
+
+    __slots__ = ["raw", "_values"]
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._values = {}
+
+    @_cached
+    def stripped(self):
+        # Text without surrounding whitespace.
+        return self.raw.strip()
+
+    @_cached
+    def text(self):
+        # Stripped text with tabs replaced by spaces.
+        return self.stripped.replace("\t", " ")
+
+    @_cached
+    def lower(self):
+        return self.text.lower()
+
+    @_cached
+    def words(self):
+        # Text split on single spaces.
+        return self.text.split(" ")
+
+    @_cached
+    def lower_words(self):
+        return self.lower.split(" ")
+
+    @_cached
+    def word_hits(self):
+        # Whether each of words is in the dictionary.
+        return [bool(word) and lexicon.check(word) for word in self.words]
+
+    @_cached
+    def lower_word_hits(self):
+        # Whether each of lower_words is in the dictionary.
+        return [bool(word) and lexicon.check(word) for word in self.lower_words]
+
+    @_cached
+    def tokens(self):
+        # NLTK word tokens of the stripped text.
+        return _word_tokenize(self.stripped)
+
+    @_cached
+    def token_hits(self):
+        # Whether each of tokens, lowercased, is in the dictionary.
+        return [lexicon.check(token.lower()) for token in self.tokens]
+
+    @_cached
+    def alpha_tokens(self):
+        # Tokens that are not punctuation.
+        return [token for token in self.tokens if token not in PUNCTUATION]
+
+    @_cached
+    def alpha_token_hits(self):
+        # Whether each of alpha_tokens, lowercased, is in the dictionary.
+        return [hit for token, hit in zip(self.tokens, self.token_hits)
+                    if token not in PUNCTUATION]
+
+    @_cached
+    def alnum_upper(self):
+        # Uppercased raw text with everything but ASCII letters and digits
+        # replaced by spaces.
+        return re.sub("[^{0}]".format(string.ascii_letters + string.digits),
+                      " ", self.raw).upper()
+
+    @_cached
+    def alnum_upper_tokens(self):
+        return _word_tokenize(self.alnum_upper)
+
+    @_cached
+    def alphabetic(self):
+        # Text with only ASCII letters and spaces.
+        return re.sub(r"[^A-Za-z\ ]+", "", self.text)
+
+    @_cached
+    def num_uppercase(self):
+        # Number of ASCII uppercase letters in the text.
+        return len(re.sub(r"[^A-Z]+", "", self.text))
+
+    @_cached
+    def num_digits(self):
+        # Number of digits in the text.
+        return len(self.text) - len(re.sub(r"\d+", "", self.text))
+
+    @_cached
+    def num_ascii(self):
+        # Number of ASCII characters in the text.
+        return len(re.sub(r"[^\x00-\x7F]+", "", self.text))
+
+    @_cached
+    def num_alpha(self):
+        # Number of alphabetic characters in the text.
+        return len([char for char in self.text if char.isalpha()])
+
+    @_cached
+    def num_symbols(self):
+        # Number of characters in the text that are not letters, digits or
+        # punctuation (including whitespace).
+        return len([char for char in self.text
+                         if (char not in string.punctuation and
+                             not char.isalpha() and not char.isdigit())])
@@ -0,0 +1,270 @@
+# nbtables.py
+
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+
+# Stands in for every feature value a feature name was never trained with.
+_UNSEEN = object()
+
+# Scores closer than this (in bits) are handed to the NLTK classifier, so that
+# ties and rounding differences resolve exactly as they do there.
+_TIE_TOLERANCE = 1e-6
+
+
+class NaiveBayesTable(object):
+    """
+    A trained nltk.NaiveBayesClassifier compiled into NumPy arrays so that
+    many featuresets can be classified with a single matrix product.
+
+    Every (feature name, feature value) pair the classifier knows about gets a
+    column, plus one column per feature name for values it never saw. For each
+    column the table holds the log probability of the pair under each label;
+    log probabilities of minus infinity are kept in a separate mask so that
+    they can be combined without producing NaNs.
+
+    labels: list
+        Labels of the classifier, in the classifier's order.
+    columns: dict
+        Maps (fname, fval) pairs to column numbers.
+    unseen: dict
+        Maps each fname to the column used for values it was not trained on.
+    priors: np.array
+        Log probability of each label.
+    weights: np.array
+        Columns by labels array of finite log probabilities.
+    impossible: np.array
+        Columns by labels array, True where the log probability is minus
+        infinity.
+    fallback: func
+        Returns the NLTK classifier the table was compiled from. Only called
+        for near-ties.
+    """
+
+    def __init__(self, labels, columns, unseen, priors, weights, impossible,
+                 fallback):
+        self.labels = labels
+        self.columns = columns
+        self.unseen = unseen
+        self.priors = priors
+        self.weights = weights
+        self.impossible = impossible
+        self.fallback = fallback
+        self._classifier = None
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        """
+        Compiles a NaiveBayesClassifier.
+
+        classifier: obj
+            Trained nltk.NaiveBayesClassifier.
+
+        returns: obj
+        """
+        labels = list(classifier.labels())
+        feature_probdist = classifier._feature_probdist
+
+        fvals = {}
+        for (_, fname), probdist in feature_probdist.items():
+            fvals.setdefault(fname, set()).update(probdist.samples())
+
+        keys = []
+        for fname in sorted(fvals, key=repr):
+            keys.extend((fname, fval) for fval in sorted(fvals[fname], key=repr))
+            keys.append((fname, _UNSEEN))
+
+        logprobs = np.empty((len(keys), len(labels)))
+        for col, (fname, fval) in enumerate(keys):
+            for j, label in enumerate(labels):
+                probdist = feature_probdist.get((label, fname))
+                logprobs[col, j] = (-np.inf if probdist is None
+                                    else probdist.logprob(fval))
+
+        priors = np.array([classifier._label_probdist.logprob(label)
+                           for label in labels])
+        return cls._from_logprobs(labels, keys, priors, logprobs,
+                                  lambda: classifier)
+
+    @classmethod
+    def _from_logprobs(cls, labels, keys, priors, logprobs, fallback):
+        columns = {}
+        unseen = {}
+        for col, (fname, fval) in enumerate(keys):
+            if fval is _UNSEEN:
+                unseen[fname] = col
+            else:
+                columns[fname, fval] = col
+        impossible = np.isneginf(logprobs)
+        weights = np.where(impossible, 0.0, logprobs)
+        return cls(labels, columns, unseen, priors, weights, impossible,
+                   fallback)
+
+    def encode(self, featuresets):
+        """
+        Turns featuresets into a rows by columns indicator matrix. Feature
+        names the classifier never saw are dropped, as NLTK does.
+
+        featuresets: list
+            Feature dicts.
+
+        returns: np.array
+        """
+        indicators = np.zeros((len(featuresets), len(self.unseen) +
+                               len(self.columns)))
+        for i, featureset in enumerate(featuresets):
+            for fname, fval in featureset.items():
+                col = self.columns.get((fname, fval))
+                if col is None:
+                    col = self.unseen.get(fname)
+                if col is not None:
+                    indicators[i, col] = 1
+        return indicators
+
+    def classify_many(self, featuresets):
+        """
+        Classifies featuresets, returning the label NLTK's classifier would.
+
+        featuresets: list
+            Feature dicts.
+
+        returns: list
+        """
+        if not featuresets:
+            return []
+        indicators = self.encode(featuresets)
+        scores = self.priors + indicators.dot(self.weights)
+        scores[indicators.dot(self.impossible) > 0] = -np.inf
+        best = scores.argmax(axis=1)
+
+        if len(self.labels) > 1:
+            ordered = np.sort(scores, axis=1)
+            near_tie = (np.isfinite(ordered[:, -2]) &
+                        (ordered[:, -1] - ordered[:, -2] < _TIE_TOLERANCE))
+            if near_tie.any():
+                classifier = self._get_classifier()
+                for i in np.flatnonzero(near_tie):
+                    best[i] = self.labels.index(
+                        classifier.classify(featuresets[i]))
+
+        return [self.labels[i] for i in best]
+
+    def classify(self, featureset):
+        return self.classify_many([featureset])[0]
+
+    def _get_classifier(self):
+        if self._classifier is None:
+            self._classifier = self.fallback()
+        return self._classifier
+
+    def save(self, filename, source=None):
+        """
+        Writes the table to a .npz file.
+
+        filename: str
+            File to write.
+        source: str
+            Digest of the pickle the table was compiled from.
+
+        returns: None
+        """
+        # [fname, fval] for seen values and [fname] for unseen ones, in
+        # column order.
+        keys = [None] * len(self.weights)
+        for (fname, fval), col in self.columns.items():
+            keys[col] = [fname, fval]
+        for fname, col in self.unseen.items():
+            keys[col] = [fname]
+        header = {"labels": self.labels, "keys": keys, "source": source}
+        with open(filename, "wb") as table_file:
+            np.savez(table_file,
+                     header=np.array(json.dumps(header)),
+                     priors=self.priors,
+                     logprobs=np.where(self.impossible, -np.inf, self.weights))
+
+    @classmethod
+    def load(cls, filename, fallback, source=None):
+        """
+        Reads a table written by save().
+
+        filename: str
+            File to read.
+        fallback: func
+            Returns the NLTK classifier the table was compiled from.
+        source: str
+            If given, digest the table must have been compiled from.
+
+        returns: obj, or None if the table is for a different source
+        """
+        with np.load(filename) as arrays:
+            header = json.loads(str(arrays["header"]))
+            if source is not None and header["source"] != source:
+                return None
+            keys = [(key[0], key[1] if len(key) > 1 else _UNSEEN)
+                    for key in header["keys"]]
+            priors = arrays["priors"]
+            logprobs = arrays["logprobs"]
+        return cls._from_logprobs(header["labels"], keys, priors, logprobs,
+                                  fallback)
+
+
+def table_filename(pickle_filename):
+    """
+    Gets the name of the .npz table exported for a classifier pickle.
+
+    pickle_filename: str
+        Name of pickle file.
+
+    returns: str
+    """
+    return os.path.splitext(pickle_filename)[0] + ".npz"
+
+
+def file_digest(filename):
+    """
+    Gets the SHA-1 digest of a file's contents.
+
+    filename: str
+        Name of file.
+
+    returns: str
+    """
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def export(pickle_filename, classifier):
+    """
+    Compiles a classifier and writes its table next to its pickle.
+
+    pickle_filename: str
+        Name of pickle file the classifier was loaded from.
+    classifier: obj
+        Trained nltk.NaiveBayesClassifier.
+
+    returns: str, name of the table written
+    """
+    filename = table_filename(pickle_filename)
+    NaiveBayesTable.from_classifier(classifier).save(
+        filename, source=file_digest(pickle_filename))
+    return filename
+
+
+def main():
+    import nltk
+    from tagger.basetagger import _DEFAULT_CLASSIFIER_PATH, load_classifier
+
+    path = sys.argv[1] if len(sys.argv) > 1 else _DEFAULT_CLASSIFIER_PATH
+    for pickle_filename in sorted(glob.glob(os.path.join(path, "*.pickle"))):
+        classifier = load_classifier(os.path.basename(pickle_filename), path)
+        if isinstance(classifier, nltk.NaiveBayesClassifier):
+            print(export(pickle_filename, classifier))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# pos.py
+
+# The part of speech tagger, loaded the first time it is needed and then
+# shared by every tagger in the process.
+_TAGGER = None
+
+# Universal tag of each Penn Treebank tag seen so far.
+_UNIVERSAL_TAGS = {}
+
+
+def get_tagger():
+    """
+    Gets the process's perceptron part of speech tagger, loading it on first
+    use.
+
+    returns: obj
+    """
+    global _TAGGER
+    if _TAGGER is None:
+        from nltk.tag import PerceptronTagger
+        _TAGGER = PerceptronTagger()
+    return _TAGGER
+
+
+def tag_sents(sents):
+    """
+    Tags each tokenized sentence with Penn Treebank tags. Gives the same tags
+    as calling nltk.pos_tag on each sentence.
+
+    sents: list
+        Lists of tokens.
+
+    returns: list of lists of tags
+    """
+    tagger = get_tagger()
+    return [[pos for _, pos in tagger.tag(tokens)] for tokens in sents]
+
+
+def to_universal(tags):
+    """
+    Maps Penn Treebank tags to universal tags, as nltk.pos_tag does with
+    tagset = "universal".
+
+    tags: list
+        Penn Treebank tags.
+
+    returns: list of tags
+    """
+    universal = []
+    for tag in tags:
+        if tag not in _UNIVERSAL_TAGS:
+            from nltk.tag.mapping import map_tag
+            _UNIVERSAL_TAGS[tag] = map_tag("en-ptb", "universal", tag)
+        universal.append(_UNIVERSAL_TAGS[tag])
+    return universal
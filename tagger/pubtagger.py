@@ -2,23 +2,23 @@
 # Daniel Kauffman
 
 import calendar
-import copy
 import regex
 import string
 
 import pandas as pd
 
 import tagger.basetagger as basetagger
+import tagger.schema as schema
 
 
 def main():
     basetagger.measure_precision_recall("PI", tag)
 
 
-def tag(issue, test = False):
-    issue = copy.deepcopy(issue)
-    issue.tags_df.page = None
-    issue.tags_df.function = None
+def tag(issue, test = False, inplace = False):
+    if not inplace:
+        issue = issue.copy()
+    schema.reset(issue.tags_df, ["page", "function"])
     matched = pd.concat([find_volume(issue.tags_df),
                          find_page_info(issue.tags_df),
                          find_date(issue.tags_df),
@@ -26,12 +26,12 @@ def tag(issue, test = False):
     if len(matched) > 0:
         matched = matched.drop_duplicates().sort_index()
         for i, row in matched.iterrows():
-            if issue.tags_df.loc[i].function is None:
-                issue.tags_df.set_value(i, "function", "PI")
+            if pd.isnull(issue.tags_df.loc[i].function):
+                issue.tags_df.at[i, "function"] = "PI"
         breaks = get_page_breaks(matched)
         ptr = 0
         for i, _ in issue.tags_df.iterrows():
-            issue.tags_df.set_value(i, "page", ptr + 1)
+            issue.tags_df.at[i, "page"] = ptr + 1
             if ptr < len(breaks) - 1 and i >= breaks[ptr + 1]:
                 ptr += 1
     return issue
@@ -0,0 +1,175 @@
+# schema.py
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Every tag the taggers write to the function column. Tagged files may add
+# others; they become extra categories.
+FUNCTION_TAGS = ["AT", "B", "BL", "BQA", "BQN", "BQT", "CN", "CT", "HL", "JNK",
+                 "JUMP", "ME", "MH", "N", "NP", "OT", "PH", "PI", "PL", "SH",
+                 "TXT"]
+
+# Columns of small whole numbers, null where untagged.
+INT_COLUMNS = ["page", "article", "paragraph"]
+INT_DTYPE = "Int16"
+
+# Jump codes: 0 for no jump, the target page for "continued on page N" and
+# minus the source page for "continued from page N". Jumps to the front or
+# back page have their own codes.
+JUMP_DTYPE = np.int8
+JUMP_NONE = 0
+JUMP_FRONT = 120
+JUMP_BACK = 121
+_JUMP_NAMES = {JUMP_FRONT: "front", JUMP_BACK: "back"}
+_JUMP_PAGE_RE = re.compile(r"-?\d+")
+
+
+def function_dtype(extra_tags=()):
+    """
+    Gets the categorical dtype of the function column.
+
+    extra_tags: iterable
+        Tags to allow besides FUNCTION_TAGS.
+
+    returns: CategoricalDtype
+    """
+    return pd.CategoricalDtype(sorted(set(FUNCTION_TAGS) | set(extra_tags)))
+
+
+def to_function(values):
+    """
+    Converts tags to the function column's dtype, stripping whitespace.
+
+    values: Series
+        Tags, null where untagged.
+
+    returns: Series
+    """
+    values = values.astype(object).where(values.notnull(), None)
+    values = values.map(lambda tag: tag.strip() if isinstance(tag, str) else tag)
+    return values.astype(function_dtype(values.dropna().unique()))
+
+
+def to_int(values):
+    """
+    Converts numbers to INT_DTYPE. Anything that is not a whole number, like
+    a stray tag in a tagged file, becomes null.
+
+    values: Series
+
+    returns: Series
+    """
+    numbers = pd.to_numeric(values, errors="coerce").astype("float64")
+    numbers = numbers.where(numbers % 1 == 0)
+    return numbers.astype(INT_DTYPE)
+
+
+def jump_code(jump):
+    """
+    Gets the code of a jump, as tagged by jumptagger or written in a tagged
+    file: a page number, minus a page number, "front" or "back", possibly
+    inside other text (e.g. "VIEWPOINT, Page 3").
+
+    jump: int, float, str or None
+
+    returns: int
+    """
+    if jump is None or isinstance(jump, bool):
+        return JUMP_NONE
+    if isinstance(jump, (int, np.integer)):
+        return int(jump) if abs(jump) < JUMP_FRONT else JUMP_NONE
+    if isinstance(jump, (float, np.floating)):
+        if np.isnan(jump) or jump % 1 != 0:
+            return JUMP_NONE
+        return jump_code(int(jump))
+
+    text = str(jump).lower()
+    if "front" in text:
+        return JUMP_FRONT
+    if "back" in text:
+        return JUMP_BACK
+    match = _JUMP_PAGE_RE.search(text)
+    return jump_code(int(match.group(0))) if match else JUMP_NONE
+
+
+def jump_label(code):
+    """
+    Gets the text of a jump code, e.g. "0", "-3" or "front".
+
+    code: int
+
+    returns: str
+    """
+    return _JUMP_NAMES.get(int(code), str(int(code)))
+
+
+def to_jump(values):
+    """
+    Converts jumps to JUMP_DTYPE codes.
+
+    values: Series
+
+    returns: Series
+    """
+    return values.map(jump_code).astype(JUMP_DTYPE)
+
+
+def empty_column(col, index):
+    """
+    Gets an untagged column in its schema dtype.
+
+    col: str
+        Column name.
+    index: Index
+        Index of the DataFrame.
+
+    returns: Series
+    """
+    if col == "function":
+        return pd.Series(pd.Categorical([None] * len(index),
+                                        dtype=function_dtype()),
+                         index=index)
+    if col in INT_COLUMNS:
+        return pd.Series(pd.array([None] * len(index), dtype=INT_DTYPE),
+                         index=index)
+    if col == "jump":
+        return pd.Series(np.full(len(index), JUMP_NONE, dtype=JUMP_DTYPE),
+                         index=index)
+    return pd.Series(np.full(len(index), np.nan, dtype=object), index=index)
+
+
+def reset(df, columns):
+    """
+    Clears columns of df in place, keeping their schema dtypes.
+
+    df: DataFrame
+    columns: list
+        Column names.
+
+    returns: None
+    """
+    for col in columns:
+        df[col] = empty_column(col, df.index)
+
+
+def apply(df):
+    """
+    Converts the tag columns of an issue's DataFrame to the schema in place:
+    categorical function, INT_DTYPE page/article/paragraph and JUMP_DTYPE
+    jump codes. Other columns are left as they are.
+
+    df: DataFrame
+
+    returns: DataFrame
+    """
+    if "function" in df:
+        df["function"] = to_function(df["function"])
+    for col in INT_COLUMNS:
+        if col in df:
+            df[col] = to_int(df[col])
+    if "jump" in df:
+        df["jump"] = to_jump(df["jump"])
+    return df
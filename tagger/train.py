@@ -0,0 +1,63 @@
+# train.py
+
+import argparse
+import os
+
+import tagger.basetagger as basetagger
+import tagger.groundtruth as groundtruth
+import tagger.junktagger as junktagger
+import tagger.txttagger as txttagger
+
+
+# Share of the tagged issues the junk classifiers are trained on, as in
+# junktagger.main(); the rest are left to test the junk tagger on.
+_JUNK_TRAINING_SHARE = 0.75
+
+
+def get_training_sets(folder=groundtruth.DEFAULT_FOLDER):
+    """
+    Gets the training set of each junk classifier and of the text classifier,
+    as their taggers' main() functions do.
+
+    folder: str
+        Folder of tagged csv files.
+
+    returns: list
+        (issues, filename, features_func, tags) of each classifier.
+    """
+    issues = groundtruth.get_tagged_issues(folder, basetagger._fill_function)
+    split = int(len(issues) * _JUNK_TRAINING_SHARE)
+    training_sets = [(issues[:split],) + tuple(classifiers[:3])
+                     for classifiers in junktagger._JUNKTAGGER_CLASSIFIERS]
+    training_sets.append((issues,) + tuple(txttagger._TXTTAGGER_CLASSIFIER[:3]))
+    return training_sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the junk and text "
+                                     "classifiers on the manually tagged "
+                                     "issues.")
+    parser.add_argument("--data", default=groundtruth.DEFAULT_FOLDER,
+                        dest="folder",
+                        help="Folder of tagged csv files (default: "
+                        "tagged_data).")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: one per "
+                        "CPU).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Compute every line's features again instead of "
+                        "using the feature store.")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print each classifier's score and most "
+                        "informative features.")
+    args = parser.parse_args()
+
+    training_sets = get_training_sets(args.folder)
+    basetagger.create_classifiers(training_sets, jobs=args.jobs,
+                                  stats=args.stats, cache=not args.no_cache)
+    for (_, filename, _, _) in training_sets:
+        print(os.path.join(basetagger._DEFAULT_CLASSIFIER_PATH, filename))
+
+
+if __name__ == "__main__":
+    main()
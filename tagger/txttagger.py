@@ -1,19 +1,11 @@
 # txttagger.py
 # Vivian Fong
 
-from nltk.corpus import names
-from nltk import sent_tokenize
-from nltk import word_tokenize
-import enchant
 import re
-import string
 
 from tagger.basetagger import *
+import tagger.lexicon as lexicon
 
-_PUNCTUATION = string.punctuation + "''"
-_ENGLISH_DICTIONARY = enchant.Dict("en_US")
-_ENGLISH_NAMES = [word.lower() for word in (names.words("female.txt") + names.words("male.txt"))
-                               if not _ENGLISH_DICTIONARY.check(word)]
 _REQUIRED_TAGS = ["PI", "BL", "B", "N", "MH"]
 
 
@@ -22,39 +14,39 @@ _REQUIRED_TAGS = ["PI", "BL", "B", "N", "MH"]
 # ===============================================
 
 
-def _features_stats_word_count(text):
+def _features_stats_word_count(line):
     """
     Gets the features on word count.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
 
-    words = word_tokenize(text)
-    alpha_only = [w for w in words if w not in _PUNCTUATION]
-    word_count = len(alpha_only)
+    word_count = len(line.alpha_tokens)
     features.update(create_features_for_ranges(feature_name="word_count",
                                                 variable=word_count,
                                                 ranges=[1, 3, 5, 15, 25]))
     return features
 
 
-def _features_stats_punctuation(text):
+def _features_stats_punctuation(line):
     """
     Gets the features on punctuation.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
+    from nltk import sent_tokenize
+
     features = {}
+    text = line.stripped
 
     sents = sent_tokenize(text)
-    words = word_tokenize(text)
 
     if '“' in text or '”' in text:
         features["has_quotes"] = True
@@ -83,29 +75,29 @@ def _features_stats_punctuation(text):
     return features
 
 
-def _features_stats_readable_word_percentage(text):
+def _features_stats_readable_word_percentage(line):
     """
     Gets the percentage of readable words.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
 
-    words = word_tokenize(text)
-    alpha_only = [w.lower() for w in words if w not in _PUNCTUATION]
+    alpha_only = [w.lower() for w in line.alpha_tokens]
     word_count = len(alpha_only)
     readable_word_percent = 0
     name_count = 0
 
     if word_count:
+        names = lexicon.non_dictionary_names()
         readable_word_score = 0
-        for word in alpha_only:
-            if _ENGLISH_DICTIONARY.check(word):
+        for word, hit in zip(alpha_only, line.alpha_token_hits):
+            if hit:
                 readable_word_score += 1
-            if word in _ENGLISH_NAMES:
+            if word in names:
                 name_count += 1
         readable_word_percent = readable_word_score / word_count
 
@@ -118,22 +110,20 @@ def _features_stats_readable_word_percentage(text):
     return features
 
 
-def _features_stats_alpha_char_percentage(text):
+def _features_stats_alpha_char_percentage(line):
     """
     Gets the percentage of alphabetic characters.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
 
-    char_count = len(text)
-    alpha_char_count = len([c for c in text if c.isalpha()])
-    random_symbol_count = len([c for c in text if c not in string.punctuation and not c.isalpha() and not c.isdigit()])
-    alpha_char_percent = alpha_char_count / char_count if char_count else 0
-    random_symbol_percent = random_symbol_count / char_count if char_count else 0
+    char_count = len(line.text)
+    alpha_char_percent = line.num_alpha / char_count if char_count else 0
+    random_symbol_percent = line.num_symbols / char_count if char_count else 0
 
     features.update(create_features_for_ranges(feature_name="alpha_char_percentage",
                                                 variable=alpha_char_percent,
@@ -144,21 +134,19 @@ def _features_stats_alpha_char_percentage(text):
     return features
 
 
-def _features_stats_uppercase(text):
+def _features_stats_uppercase(line):
     """
     Gets the percentage of uppercased words.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
 
-    words = word_tokenize(text)
-    alpha_only = [w for w in words if w not in _PUNCTUATION]
-    word_count = len(alpha_only)
-    uppercase_count = len([w for w in words if w.isupper()])
+    word_count = len(line.alpha_tokens)
+    uppercase_count = len([w for w in line.tokens if w.isupper()])
     percent = uppercase_count / word_count if word_count else 0
 
     features.update(create_features_for_ranges(feature_name="uppercase_percentage",
@@ -170,16 +158,17 @@ def _features_stats_uppercase(text):
     return features
 
 
-def _features_stats_prefix(text):
+def _features_stats_prefix(line):
     """
     Gets features for the first character and first word.
 
-    text: str
-        Text to perform analysis on.
+    line: obj
+        LineFeatures of the text to perform analysis on.
 
     returns: dict
     """
     features = {}
+    text = line.stripped
 
     if text:
         first_char = text[0]
@@ -190,7 +179,7 @@ def _features_stats_prefix(text):
         elif first_char == '“':
             features["first_char"] = "quote"
 
-        words = word_tokenize(text)
+        words = line.tokens
         if words:
             first_word = words[0]
             if first_word.isalpha():
@@ -204,23 +193,22 @@ def _features_stats_prefix(text):
 # ========================================
 
 
-def _generate_features_txt(row_data):
+def _generate_features_txt(line):
     """
     Generates a classifier that identifies article text (TXT).
 
-    row_data: obj
-        Series containing a row of issue data.
+    line: obj
+        LineFeatures of the row.
 
     returns: dict
     """
     features = {}
-    text = row_data.text.strip()
-    features.update(_features_stats_word_count(text))
-    features.update(_features_stats_punctuation(text))
-    features.update(_features_stats_readable_word_percentage(text))
-    features.update(_features_stats_uppercase(text))
-    features.update(_features_stats_alpha_char_percentage(text))
-    features.update(_features_stats_prefix(text))
+    features.update(_features_stats_word_count(line))
+    features.update(_features_stats_punctuation(line))
+    features.update(_features_stats_readable_word_percentage(line))
+    features.update(_features_stats_uppercase(line))
+    features.update(_features_stats_alpha_char_percentage(line))
+    features.update(_features_stats_prefix(line))
     return features
 
 
@@ -257,23 +245,22 @@ def _drop_surrounding_funcs_references(issue):
                        axis=1, inplace=True)
 
 
-def _tag_txt(row, classifier, features_func):
+def _tag_txt(rows, classify):
     """
-    Tags the row as article text (TXT) if the classifier indicates True.
+    Tags the rows with text as article text (TXT) if the classifier indicates
+    True.
 
-    row: obj
-        DataFrame row to return value for.
-    features_func: func
-        Function that generates the features.
+    rows: obj
+        DataFrame rows to return labels for.
+    classify: func
+        Classifies rows with the classifier.
 
-    returns: str
+    returns: np.array
     """
-    if pd.isnull(row.function) and not pd.isnull(row.text):
-        features = features_func(row)
-        if classifier.classify(features):
-            return "TXT"
-
-    return row.function
+    is_txt = np.zeros(len(rows), dtype=bool)
+    has_text = rows.text.notnull().values
+    is_txt[has_text] = classify(rows.loc[has_text])
+    return np.where(is_txt, "TXT", None)
 
 
 # ==================================
@@ -323,6 +310,7 @@ def smooth(issue):
     """
 
     _setup_surrounding_funcs_references(issue)
+    lines = issue.get_line_features()
 
     for index, row in issue.tags_df.iterrows():
         curr_func = row.function if row.function != "TXT" else None
@@ -351,7 +339,7 @@ def smooth(issue):
             if "(AP) —" in row.text:
                 issue.tags_df.loc[index, "function"] = "TXT"
 
-            words = word_tokenize(row.text)
+            words = lines.at[index].tokens
             if words:
                 if len(words) == 1 and row.function == "TXT":
                     issue.tags_df.loc[index, "function"] = None
@@ -373,22 +361,25 @@ def smooth(issue):
 _TXTTAGGER_CLASSIFIER = ("txttagger_TXT_naive_bayes.pickle", _generate_features_txt, ["TXT"], _tag_txt)
 
 
-def tag(issue):
+def tag(issue, inplace=False):
     """
     Tags the issue with the TXT tag.
 
     issue: obj
         Issue object to apply tags to.
+    inplace: bool
+        Whether to tag issue itself instead of a copy of it (default=False).
     """
     assert check_tags_exist(issue, _REQUIRED_TAGS)
-    issue = copy.deepcopy(issue)
+    if not inplace:
+        issue = issue.copy()
 
     filename = _TXTTAGGER_CLASSIFIER[0]         # "txttagger_TXT_naive_bayes.pickle"
     features_func = _TXTTAGGER_CLASSIFIER[1]    # _generate_features_txt
     label_func = _TXTTAGGER_CLASSIFIER[3]       # _tag_txt
 
-    issue.apply_classifier(col="function", filename=filename,
-                            features_func=features_func, label_func=label_func)
+    issue.label_with_classifier(filename=filename, features_func=features_func,
+                                label_func=label_func)
     issue = smooth(issue)
     return issue
 